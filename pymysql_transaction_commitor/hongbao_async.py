@@ -0,0 +1 @@
+#!/usr/bin/env python# coding=utf-8import osimport timeimport tracebackfrom gevent import monkeyfrom gevent.pool import Pool as GreenletPoolfrom hongbao_journal import Journalfrom hongbao_manager import HongbaoManagerfrom member_index import get_member_indexfrom my_dao import get_poolfrom my_random import RandomStream, seed_workerfrom my_stats import Statsfrom my_util import init_loggerdef split_sessions(concurrency, loops):    """把并发会话数平均分配到各个事件循环进程"""    return [concurrency // loops + (1 if i < concurrency % loops else 0) for i in range(loops)]def run_sessions(name, level, method, sessions, users=100, friends=20, groups=2, groups_members=30,                 hongbaos=5, sleep=0, routing="random", member_index=True, index_refresh=10,                 stats_queue=None, journal_dir=None, fsync_interval=1, seed=None, hot_groups=0, hot_share=0):    """    单进程事件循环    sessions个协程会话复用HongbaoManager的事务逻辑,每个会话一个MySQL连接    """    # PyMySQL是纯Python实现,patch socket后阻塞IO自动切换协程    monkey.patch_all(thread=False, os=False, signal=False, subprocess=False)    start = time.time()    log_name = os.path.basename(__file__).replace(".py", "") + "_" + str(name)    logger = init_logger(log_name=log_name, level=level)    logger.debug('Run event loop %s (%s) with %s sessions...' % (name, os.getpid(), sessions))    pool = get_pool(routing=routing, size=sessions, start=name, logger=logger)    seed_worker(seed, name)    # 会话共享统计对象,由事件循环定期发送给reporter    stats = Stats(stats_queue)    journal = Journal.for_worker(journal_dir, name, fsync_interval=fsync_interval) if journal_dir else None    if method == "hongbao" and member_index:        # 会话共享群成员索引,启动会话前先全量加载一次        get_member_index(HongbaoManager(logger=logger, pool=pool, stats=stats), index_refresh)    greenlets = GreenletPool(sessions)    for i in range(sessions):        # 每个会话一个随机数据流, worker编号在所有事件循环间不重复, 会话数多时减小预生成块        random_stream = RandomStream(seed, (name + 1) * 1000000 + i, block_size=1000)        greenlets.spawn(run_session, logger, pool, stats, journal, random_stream, method, users, friends, groups, groups_members, hongbaos, sleep,                        member_index, index_refresh, hot_groups, hot_share)    greenlets.join()    stats.flush()    if journal:        journal.close()    end = time.time()    logger.debug('Event loop %s runs %0.2f seconds.' % (name, (end - start)))def run_session(logger, pool, stats, journal, random_stream, method, users, friends, groups, groups_members, hongbaos, sleep,                member_index, index_refresh, hot_groups=0, hot_share=0):    """单个协程会话"""    pm = HongbaoManager(logger=logger, pool=pool, stats=stats)    pm.journal = journal    pm.random_stream = random_stream    try:        if method == "user":            pm.create_users(users=users, friends=friends, groups=groups, groups_members=groups_members, sleep=sleep)        elif method == "hongbao":            pm.create_hongbaos(users=users, hongbaos=hongbaos, sleep=sleep, member_index=member_index,                               refresh_interval=index_refresh, hot_groups=hot_groups, hot_share=hot_share)    except:        logger.error(traceback.format_exc())    finally:        pm.disconnect()
\ No newline at end of file
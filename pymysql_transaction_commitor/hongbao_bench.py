@@ -0,0 +1 @@
+#!/usr/bin/env python# coding=utf-8import argparseimport jsonimport loggingimport osimport platformimport shutilimport subprocessimport sysimport tempfileimport timefrom argparse import RawTextHelpFormatterfrom collections import OrderedDictfrom multiprocessing import Manager, Poolimport numpy as npimport pymysqlfrom hongbao_manager import HongbaoManagerfrom member_index import MemberIndexfrom my_dao import ConnectionPoolfrom my_random import seed_workerfrom my_stats import Statsfrom my_util import init_loggertry:    from Queue import Emptyexcept ImportError:    from queue import EmptySCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "schema", "db_hongbao_tables.sql")# 负载配置: 造数规模和事务类型权重PROFILES = OrderedDict([    ("seed-heavy", {        "users": 1000, "friends": 10, "groups": 2, "members": 20,        "mix": {"create_user": 50, "create_group": 40, "create_hongbao": 10},    }),    ("hongbao-heavy", {        "users": 1000, "friends": 10, "groups": 2, "members": 20,        "mix": {"create_hongbao": 90, "user_add_balance": 10},    }),    ("mixed", {        "users": 1000, "friends": 10, "groups": 2, "members": 20,        "mix": {"create_hongbao": 50, "user_add_balance": 20, "user_bank_add_balance": 20, "create_group": 10},    }),    # 大部分红包发到少数几个群,测试热点行锁争用    ("hot-group", {        "users": 1000, "friends": 10, "groups": 2, "members": 20,        "mix": {"create_hongbao": 100},        "hot_groups": 5, "hot_share": 0.9,    }),])def parse_args():    """parse args for hongbao benchmark"""    parser = argparse.ArgumentParser(description='''    Hongbao transaction benchmark.    use examples:    # list workload profiles    python hongbao_bench.py -m profiles    # start a throwaway mysqld, seed it and run 60 seconds of hongbao-heavy load at 500 tps    python hongbao_bench.py -m run --profile hongbao-heavy --mysqld /usr/sbin/mysqld -c 4 --rate 500 --duration 60 \\        --seed 1 --output hongbao-heavy.json    # run 10000 transactions as fast as possible against the servers in hongbao.cnf    python hongbao_bench.py -m run --profile mixed -c 4 --count 10000 --seed 1 --output mixed.json    # compare two results    python hongbao_bench.py -m compare baseline.json mixed.json    ''', formatter_class=RawTextHelpFormatter, add_help=False)    parser.add_argument("-m", "--method", type=str, dest='method',                        help='The methods of: profiles,run,compare')    parser.add_argument("results", nargs="*", help='Result files to compare.')    parser.add_argument("--profile", type=str, dest='profile', default='hongbao-heavy', choices=list(PROFILES),                        help='Workload profile.')    parser.add_argument("-c", "--threads", type=int, default=4, dest='threads',                        help='How many worker processes will be running.')    parser.add_argument("--rate", type=float, default=0, dest='rate',                        help='Target transactions per second of all workers with poisson arrivals, 0 is unpaced.')    parser.add_argument("--duration", type=float, default=0, dest='duration',                        help='Run for this many seconds.')    parser.add_argument("--count", type=int, default=0, dest='count',                        help='Run this many transactions, used when --duration is not set.')    parser.add_argument("--seed", type=int, default=0, dest='seed',                        help='Random seed of data generation, transaction mix and arrivals.')    parser.add_argument("--scale", type=float, default=1, dest='scale',                        help='Multiply the number of seeded users of the profile.')    parser.add_argument("--skip-seed", dest='skip_seed', action='store_true', default=False,                        help='Use the data already in the database.')    parser.add_argument("--mysqld", type=str, dest='mysqld', default=None,                        help='Start a local mysqld from this binary with a temporary datadir, '                             'otherwise use the servers in hongbao.cnf.')    parser.add_argument("--port", type=int, dest='port', default=33306,                        help='Port of the local mysqld.')    parser.add_argument("--output", type=str, dest='output', default=None,                        help='Write the json result to this file.')    parser.add_argument("-l", '--level', type=int, dest='log_level', default=logging.WARNING,                        help='logging level: CRITICAL = 50, ERROR = 40, WARNING = 30, INFO = 20, DEBUG = 10')    parser.add_argument('-h', '--help', dest='help', action='store_true', help='help information', default=False)    return parserdef command_line_args(args):    need_print_help = False if args else True    parser = parse_args()    args = parser.parse_args(args)    if args.help or need_print_help:        parser.print_help()        sys.exit(1)    if not args.method:        raise ValueError('The method must be specified and not empty.')    if args.method == "run" and not args.duration and not args.count:        raise ValueError('Either --duration or --count must be specified.')    return argsclass LocalMySQL:    """基准测试用的临时MySQL实例,数据目录在临时目录中,停止时删除"""    def __init__(self, mysqld, port=33306):        self.mysqld = mysqld        self.port = port        self.basedir = None        self.process = None    def settings(self):        return {            'host': "127.0.0.1",            'port': self.port,            'user': "root",            'password': "",            'charset': "utf8",            'db': "db_hongbao"        }    def start(self, timeout=120):        self.basedir = tempfile.mkdtemp(prefix="ptc_bench_")        datadir = os.path.join(self.basedir, "data")        options = ["--no-defaults", "--datadir=" + datadir]        if hasattr(os, "getuid") and os.getuid() == 0:            options.append("--user=root")        with open(os.path.join(self.basedir, "initialize.log"), "w") as log:            subprocess.check_call([self.mysqld] + options + ["--initialize-insecure"], stdout=log, stderr=log)        self.process = subprocess.Popen([self.mysqld] + options + [            "--port=%d" % self.port,            "--bind-address=127.0.0.1",            "--socket=" + os.path.join(self.basedir, "mysqld.sock"),            "--pid-file=" + os.path.join(self.basedir, "mysqld.pid"),            "--log-error=" + os.path.join(self.basedir, "error.log"),        ])        deadline = time.time() + timeout        while True:            try:                settings = self.settings()                pymysql.connect(host=settings["host"], port=settings["port"], user=settings["user"],                                password=settings["password"]).close()                return self            except pymysql.MySQLError:                if self.process.poll() is not None or time.time() > deadline:                    raise RuntimeError("mysqld did not start, see %s/error.log" % self.basedir)                time.sleep(0.5)    def stop(self):        if self.process and self.process.poll() is None:            self.process.terminate()            self.process.wait()        if self.basedir:            shutil.rmtree(self.basedir, ignore_errors=True)def load_schema(settings, schema_file=SCHEMA_FILE):    """执行建表脚本,支持delimiter,忽略库不存在时drop database的错误"""    conn = pymysql.connect(host=settings["host"], port=settings["port"], user=settings["user"],                           password=settings["password"], charset=settings["charset"])    delimiter, statement = ";", []    try:        with conn.cursor() as cursor:            with open(schema_file) as f:                for line in f:                    stripped = line.strip()                    if not statement and (not stripped or stripped.startswith("--")):                        continue                    if stripped.lower().startswith("delimiter "):                        delimiter = stripped.split()[1]                        continue                    statement.append(line)                    if stripped.endswith(delimiter):                        sql = "".join(statement).strip()[:-len(delimiter)]                        statement = []                        try:                            cursor.execute(sql)                        except pymysql.MySQLError as e:                            # 1008: Can't drop database; database doesn't exist                            if e.args[0] != 1008:                                raise    finally:        conn.close()def git_commit():    try:        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),                                       stderr=subprocess.STDOUT).decode().strip()    except (OSError, subprocess.CalledProcessError):        return Nonedef run_worker(worker, profile, servers, seed, name_salt, ready, start, rate, duration, count):    """    单个压测进程    连接数据库并加载群成员索引后通过ready通知主进程,从start取得所有worker统一的开始时间    开环压测时按泊松到达时间发起事务,延迟从计划时间开始计算,包含排队等待时间    :return: 统计快照, 各事务成功和失败次数    """    logger = logging.getLogger()    random_stream = seed_worker(seed, worker, name_salt)    rng = np.random.RandomState([seed, worker, 1000])    pm = HongbaoManager(logger=logger, pool=ConnectionPool(servers, logger=logger), stats=Stats())    pm.random_stream = random_stream    pm.member_index = MemberIndex().load(pm)    hot_gids = pm.member_index.first_gids(profile.get("hot_groups", 0))    ops = sorted(profile["mix"])    weights = np.array([profile["mix"][op] for op in ops], dtype=float)    choices = rng.choice(len(ops), size=100000, p=weights / weights.sum())    results = dict((op, [0, 0]) for op in ops)    ready.put(worker)    start_at = start.get()    while time.time() < start_at:        time.sleep(max(0, start_at - time.time()))    scheduled, done = start_at, 0    while (duration and scheduled < start_at + duration) or (not duration and done < count):        if rate:            # 每个进程承担rate的1/n,按指数分布间隔安排下一个事务            scheduled += rng.exponential(1.0 / rate)            delay = scheduled - time.time()            if delay > 0:                time.sleep(delay)        else:            scheduled = time.time()        if duration and scheduled >= start_at + duration:            break        op = ops[choices[done % len(choices)]]        ok = run_op(pm, op, hot_gids, profile, rng)        pm.stats.record(op, "ok" if ok else "failed", time.time() - scheduled)        results[op][0 if ok else 1] += 1        done += 1        if done % 1000 == 0:            pm.member_index.maybe_refresh(pm)    pm.disconnect()    return pm.stats.snapshot(), resultsdef run_op(pm, op, hot_gids, profile, rng):    index = pm.member_index    if op == "create_user":        return pm.create_user() is not False    if op == "create_hongbao":        if hot_gids and rng.random_sample() < profile.get("hot_share", 0):            gid = hot_gids[rng.randint(len(hot_gids))]            return bool(pm.create_hongbao(index.random_member(gid), gid=gid))        return bool(pm.create_hongbao(index.random_uid()))    if op == "create_group":        return pm.create_group(index.random_uid(), profile["members"]) is not False    if op == "user_add_balance":        return pm.user_add_balance(index.random_uid(), 10000)    if op == "user_bank_add_balance":        return pm.user_bank_add_balance(index.random_uid(), 100)    raise ValueError("Unknown transaction type: %s" % op)def wait_ready(ready, workers):    """等待所有worker就绪,worker在就绪前失败时抛出它的异常"""    count = 0    while count < len(workers):        try:            ready.get(timeout=1)            count += 1        except Empty:            for worker in workers:                if worker.ready():                    worker.get()def run_bench(args):    profile = PROFILES[args.profile]    logger = init_logger(log_name="hongbao_bench", level=args.log_level)    local = None    if args.mysqld:        local = LocalMySQL(args.mysqld, args.port).start()        load_schema(local.settings())        servers = OrderedDict([("local", local.settings())])    else:        servers = ConnectionPool.from_config().servers    try:        result = OrderedDict([            ("profile", args.profile),            ("commit", git_commit()),            ("python", platform.python_version()),            ("params", OrderedDict([("threads", args.threads), ("rate", args.rate), ("duration", args.duration),                                    ("count", args.count), ("seed", args.seed), ("scale", args.scale),                                    ("local_mysqld", bool(local))])),        ])        pm = HongbaoManager(logger=logger, pool=ConnectionPool(servers, logger=logger))        if not args.skip_seed:            # 同一seed的造数名称固定,库中已有数据时唯一键冲突,结果不可比较            if pm.query2one("select count(*) users from `user`")["users"]:                raise RuntimeError("The database is not empty, use --skip-seed or a fresh --mysqld instance.")            pm.random_stream = seed_worker(args.seed, 0)            start = time.time()            seed_stats = pm.create_users_bulk(users=int(profile["users"] * args.scale), friends=profile["friends"],                                              groups=profile["groups"], groups_members=profile["members"])            result["seed"] = OrderedDict([("elapsed", round(time.time() - start, 3))] + [                (table, round(rows / seconds, 1) if seconds else 0) for table, (rows, seconds) in sorted(seed_stats.items())])        # 压测中新建用户和群的名称混入当前最大uid和gid,空库上可重放,已有数据时不与之前的名称冲突        ids = pm.query2one("select (select coalesce(max(uid), 0) from `user`) max_uid, "                           "(select coalesce(max(gid), 0) from `group`) max_gid")        name_salt = (int(ids["max_uid"]) * 1000003 + int(ids["max_gid"])) % 2 ** 32        result["params"]["name_salt"] = name_salt        pm.reset_connection()        # 所有worker连接数据库并加载群成员索引后才确定开始时间,启动耗时不计入开环到达时间        manager = Manager()        ready, start = manager.Queue(), manager.Queue()        p = Pool(args.threads)        try:            workers = [p.apply_async(run_worker, (                i + 1, profile, servers, args.seed, name_salt, ready, start, args.rate / args.threads, args.duration,                args.count // args.threads + (1 if i < args.count % args.threads else 0)))                for i in range(args.threads)]            wait_ready(ready, workers)            start_at = time.time() + 0.1            for _ in workers:                start.put(start_at)            outputs = [worker.get() for worker in workers]            elapsed = time.time() - start_at        finally:            p.terminate()            p.join()            manager.shutdown()        stats, ops = Stats(), {}        for snapshot, results in outputs:            stats.merge(snapshot)            for op, (ok, failed) in results.items():                ops.setdefault(op, [0, 0])                ops[op][0] += ok                ops[op][1] += failed        total = sum(ok for ok, _ in ops.values())        result["run"] = OrderedDict([            ("elapsed", round(elapsed, 3)),            ("tps", round(total / elapsed, 2)),            ("errors", stats.errors()),            ("retries", stats.count("retry")),            ("aborts", stats.count("abort")),            ("ops", OrderedDict()),        ])        for op in sorted(ops):            p50, p95, p99 = stats.percentiles("ok", op)            result["run"]["ops"][op] = OrderedDict([                ("ok", ops[op][0]), ("failed", ops[op][1]), ("tps", round(ops[op][0] / elapsed, 2)),                ("p50_ms", round(p50, 3)), ("p95_ms", round(p95, 3)), ("p99_ms", round(p99, 3))])    finally:        if local:            local.stop()    output = json.dumps(result, indent=2)    print(output)    if args.output:        with open(args.output, "w") as f:            f.write(output + "\n")    return resultdef compare(base_file, new_file):    """对比两次结果的TPS和p99延迟"""    with open(base_file) as f:        base = json.load(f)    with open(new_file) as f:        new = json.load(f)    change = lambda a, b: "%+.1f%%" % ((b - a) * 100.0 / a) if a else "n/a"    print("%-24s %12s %12s %9s %12s %12s %9s" % ("op", "base tps", "new tps", "change", "base p99", "new p99", "change"))    for op in sorted(set(base["run"]["ops"]) | set(new["run"]["ops"])):        b, n = base["run"]["ops"].get(op, {}), new["run"]["ops"].get(op, {})        print("%-24s %12.1f %12.1f %9s %12.3f %12.3f %9s" % (            op, b.get("tps", 0), n.get("tps", 0), change(b.get("tps", 0), n.get("tps", 0)),            b.get("p99_ms", 0), n.get("p99_ms", 0), change(b.get("p99_ms", 0), n.get("p99_ms", 0))))    print("%-24s %12.1f %12.1f %9s" % ("total", base["run"]["tps"], new["run"]["tps"],                                       change(base["run"]["tps"], new["run"]["tps"])))if __name__ == '__main__':    args = command_line_args(sys.argv[1:])    if args.method == "profiles":        print(json.dumps(PROFILES, indent=2))    elif args.method == "run":        run_bench(args)    elif args.method == "compare":        compare(args.results[0], args.results[1])
\ No newline at end of file
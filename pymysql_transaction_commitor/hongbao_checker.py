@@ -0,0 +1 @@
+#!/usr/bin/env python# coding=utf-8import jsonimport loggingimport osimport timefrom multiprocessing import Poolfrom my_dao import ConnectionPool, MyDAOfrom my_util import init_logger# 每种检查: 主键, 主键范围来源表, 增量检查时找出变更主键的SQL, 检查SQLCHECKS = {    "user": {        "pk": "u.uid",        "range_sql": "select min(uid) min_id, max(uid) max_id from `user`",        # 用户,银行,好友和收发红包记录有变更的用户        "changed_sql": """            select uid id from `user` where upt_time >= %(since)s            union select uid from `user_bank` where upt_time >= %(since)s            union select uid from `user_friends` where upt_time >= %(since)s            union select uid from `hongbao` where upt_time >= %(since)s            union select uid from `hongbao_detail` where upt_time >= %(since)s        """,        # 余额 + 银行存款 + 发出红包 - 收到红包 = 初始金额, 好友数 = 好友记录数        "check_sql": """            select u.uid id, u.balance, b.balance bank_balance, u.friends,                (select count(*) from `user_friends` f where f.uid = u.uid) uf_count,                (select coalesce(sum(h.amount), 0) from `hongbao` h where h.uid = u.uid) sent,                (select coalesce(sum(d.amount), 0) from `hongbao_detail` d where d.uid = u.uid) received            from `user` u left join `user_bank` b on b.uid = u.uid            where %(cond)s            having bank_balance is null or balance + bank_balance + sent - received <> %(init_balance)s                or friends <> uf_count        """,    },    "hongbao": {        "pk": "h.reid",        "range_sql": "select min(reid) min_id, max(reid) max_id from `hongbao`",        "changed_sql": """            select reid id from `hongbao` where upt_time >= %(since)s            union select reid from `hongbao_detail` where upt_time >= %(since)s        """,        # 红包金额 = 红包明细金额之和        "check_sql": """            select h.reid id, h.amount,                (select coalesce(sum(d.amount), 0) from `hongbao_detail` d where d.reid = h.reid) detail_amount            from `hongbao` h            where %(cond)s            having amount <> detail_amount        """,    },    "group": {        "pk": "g.gid",        "range_sql": "select min(gid) min_id, max(gid) max_id from `group`",        "changed_sql": """            select gid id from `group` where upt_time >= %(since)s            union select gid from `group_member` where upt_time >= %(since)s        """,        # 群成员数 = 群成员记录数        "check_sql": """            select g.gid id, g.group_members,                (select count(*) from `group_member` m where m.gid = g.gid) gm_count            from `group` g            where %(cond)s            having group_members <> gm_count        """,    },}class HongbaoChecker(MyDAO):    """    红包数据一致性检查    按主键范围分块检查每行数据,可从检查点开始只检查upt_time有变更的行    """    # 检查点时间水位回退秒数,覆盖检查开始时尚未提交的事务    WATERMARK_LAG = 10    def __init__(self, *args, **kw):        MyDAO.__init__(self, *args, **kw)    def watermark(self):        return self.query2one("select now() - interval %s second watermark", (self.WATERMARK_LAG,))["watermark"]    def chunks(self, kind, chunk_size=10000, since=None):        """        检查任务分块        :return: [(kind, start, end, ids)], 全量检查按主键范围, 增量检查按变更主键列表        """        check = CHECKS[kind]        if since is not None:            ids = sorted(row["id"] for row in self.query2list(check["changed_sql"], {"since": since}))            return [(kind, None, None, ids[i:i + chunk_size]) for i in range(0, len(ids), chunk_size)]        id_range = self.query2one(check["range_sql"])        if id_range["min_id"] is None:            return []        return [(kind, start, start + chunk_size, None)                for start in range(id_range["min_id"], id_range["max_id"] + 1, chunk_size)]    def check_chunk(self, kind, start=None, end=None, ids=None, init_balance=10000000):        """检查一个分块,返回不一致的行"""        check = CHECKS[kind]        if ids is not None:            cond = "%s in (%s)" % (check["pk"], ",".join(["%s"] * len(ids)))            para = list(ids)        else:            cond = "%s >= %%s and %s < %%s" % (check["pk"], check["pk"])            para = [start, end]        sql = check["check_sql"] % {"cond": cond, "init_balance": "%s"}        if kind == "user":            para.append(init_balance)        return [dict((k, int(v) if v is not None else None) for k, v in row.items())                for row in self.query2list(sql, para)]# 每个检查进程一个HongbaoChecker_checker = Nonedef check_task(task, init_balance):    global _checker    if _checker is None:        # 检查进程由run_check fork产生,沿用父进程logger,但不能共用父进程的连接        logger = logging.getLogger()        _checker = HongbaoChecker(logger=logger, pool=ConnectionPool.from_config(logger=logger))    kind, start, end, ids = task    return kind, _checker.check_chunk(kind, start, end, ids, init_balance)def run_check(level, processes=4, chunk_size=10000, init_balance=10000000, checkpoint=None, incremental=False):    """    并行检查所有分块并输出不一致的uid/reid/gid    没有发现不一致时把本次开始时间写入检查点,下次增量检查从该时间开始    """    logger = init_logger(log_name="hongbao_checker", level=level)    checker = HongbaoChecker(logger=logger, pool=ConnectionPool.from_config(logger=logger))    since = None    if incremental and checkpoint and os.path.isfile(checkpoint):        with open(checkpoint) as f:            since = json.load(f)["watermark"]        logger.info(u"增量检查,检查点: %s" % since)    watermark = checker.watermark()    start = time.time()    tasks = []    for kind in ("user", "hongbao", "group"):        tasks.extend(checker.chunks(kind, chunk_size, since))    checker.reset_connection()    logger.info(u"检查任务分块: %d" % len(tasks))    bad_rows = dict((kind, []) for kind in CHECKS)    p = Pool(processes)    for kind, rows in p.imap_unordered(_check_task_args, [(task, init_balance) for task in tasks]):        for row in rows:            logger.error(u"[%s]数据不一致: %s" % (kind, json.dumps(row, sort_keys=True)))        bad_rows[kind].extend(rows)    p.close()    p.join()    for kind in ("user", "hongbao", "group"):        logger.info(u"[%s]不一致: %d %s" % (kind, len(bad_rows[kind]), sorted(row["id"] for row in bad_rows[kind])))    logger.info(u"检查完成,耗时%0.2f秒" % (time.time() - start))    if checkpoint and not any(bad_rows.values()):        with open(checkpoint, "w") as f:            json.dump({"watermark": str(watermark)}, f)    return bad_rowsdef _check_task_args(args):    return check_task(*args)
\ No newline at end of file
@@ -1 +1 @@
-import argparseimport loggingimport osimport sysimport timefrom multiprocessing import Poolfrom hongbao_manager import HongbaoManagerfrom my_util import init_loggerfrom argparse import RawTextHelpFormatterdef parse_args():    """parse args for mysql transaction commitor"""    parser = argparse.ArgumentParser(description='''    Hongbao transaction commitor.        use examples:    # create users    python hongbao_commitor.py -m user -u 200 -f 20 -g 10 --members 50        # create hongbao    python hongbao_commitor.py -m hongbao  -c 1 -u 100 -b 50        # drop database    python hongbao_commitor.py -e cleanup    ''', formatter_class=RawTextHelpFormatter, add_help=False)    parser.add_argument("-m", "--method", type=str, dest='method',                        help='The methods of: user,hongbao')    parser.add_argument("-c", "--threads", type=int, default=1, dest='threads',                        help='How many threads will be running.')    parser.add_argument("-s", "--sleep", type=int, default=0, dest='sleep',                        help='Sleep seconds between each transaction. ')    parser.add_argument('-u', '--users', dest='users', type=int,                        help='How many users will be created.', default=1000)    parser.add_argument('-f', '--friends', dest='friends', type=int,                        help='How many friends each user will be created.', default=50)    parser.add_argument('-g', '--groups', dest='groups', type=int,                        help='How many groups each user will be created.', default=5)    parser.add_argument('--members', dest='members', type=int,                        help='How many members each group will be created.', default=100)    parser.add_argument('-b', '--hongbaos', dest='hongbaos', type=int,                        help='How many friends each user will be created.', default=5)    parser.add_argument("-l", '--level', type=int, dest='log_level', default=logging.INFO,                        help='logging level: CRITICAL = 50, ERROR = 40, WARNING = 30, INFO = 20, DEBUG = 10')    parser.add_argument('-h', '--help', dest='help', action='store_true', help='help information', default=False)    return parserdef command_line_args(args):    need_print_help = False if args else True    parser = parse_args()    args = parser.parse_args(args)    if args.help or need_print_help:        parser.print_help()        sys.exit(1)    if not args.method:        raise ValueError('The method must be specified and not empty.')    return argsdef create_users_task(name, level, users=5, friends=20, groups=2, groups_members=30, sleep=0):    start = time.time()    log_name = os.path.basename(__file__).replace(".py", "") + "_" + str(name)    logger = init_logger(log_name=log_name, level=level)    logger.debug('Run task %s (%s)...' % (name, os.getpid()))    pm = HongbaoManager(logger=logger)    pm.create_users(users=users, friends=friends, groups=groups, groups_members=groups_members, sleep=sleep)    end = time.time()    logger.debug('Task %s runs %0.2f seconds.' % (name, (end - start)))def create_hongbaos(name, level, users=100, hongbaos=5, sleep=0):    start = time.time()    log_name = os.path.basename(__file__).replace(".py", "") + "_" + str(name)    logger = init_logger(log_name=log_name, level=level)    logger.debug('Run task %s (%s)...' % (name, os.getpid()))    pm = HongbaoManager(logger=logger)    pm.create_hongbaos(users=users, hongbaos=hongbaos, sleep=sleep)    end = time.time()    logger.debug('Task %s runs %0.2f seconds.' % (name, (end - start)))if __name__ == '__main__':    args = command_line_args(sys.argv[1:])    method = args.method    max_threads = args.threads    log_level = args.log_level    p = Pool(max_threads)    for i in range(max_threads):        if method == "user":            p.apply_async(create_users_task, args=(i, log_level, args.users, args.friends, args.groups, args.members, args.sleep))        elif method == "hongbao":            p.apply_async(create_hongbaos, args=(i, log_level, args.users, args.hongbaos, args.sleep))    p.close()    p.join()    print('All done.')
\ No newline at end of file
+import argparseimport loggingimport multiprocessingimport osimport sysimport timeimport tracebackfrom multiprocessing import Poolfrom hongbao_journal import Journal, JournalVerifierfrom hongbao_manager import HongbaoManagerfrom my_dao import ConnectionPool, MyDAO, get_poolfrom my_random import seed_workerfrom my_stats import Stats, StatsReporterfrom my_util import init_loggerfrom argparse import RawTextHelpFormatterdef parse_args():    """parse args for mysql transaction commitor"""    parser = argparse.ArgumentParser(description='''    Hongbao transaction commitor.        use examples:    # create users    python hongbao_commitor.py -m user -u 200 -f 20 -g 10 --members 50    # create users with multi-row batches    python hongbao_commitor.py -m user -u 1000000 -f 20 -g 2 --members 50 --bulk --batch-size 2000        # create hongbao    python hongbao_commitor.py -m hongbao  -c 1 -u 100 -b 50    # create hongbao with 2000 concurrent sessions on one event loop per core    python hongbao_commitor.py -m hongbao --engine async --concurrency 2000 -u 10 -b 50    # create hongbao, report tps and latency every 10 seconds and save a json summary    python hongbao_commitor.py -m hongbao  -c 8 -u 100 -b 50 --stats-interval 10 --stats-output stats.json    # create hongbao, spread workers over all [serverN] sections    python hongbao_commitor.py -m hongbao  -c 8 -u 100 -b 50 --routing round_robin    # create hongbao, send 80% of them to 3 hot groups to measure lock contention    python hongbao_commitor.py -m hongbao  -c 8 -u 100 -b 50 --hot-groups 3 --hot-share 0.8        # check consistency with 8 processes, later runs only check rows changed since the last clean check    python hongbao_commitor.py -m check -c 8 --checkpoint hongbao_check.json --incremental    # create hongbao with a commit journal, then verify it against the new primary after a failover    python hongbao_commitor.py -m hongbao  -c 8 -u 100 -b 50 --journal journal    python hongbao_commitor.py -m verify --journal journal    # drop database    python hongbao_commitor.py -e cleanup    ''', formatter_class=RawTextHelpFormatter, add_help=False)    parser.add_argument("-m", "--method", type=str, dest='method',                        help='The methods of: user,hongbao,check,verify')    parser.add_argument("-c", "--threads", type=int, default=1, dest='threads',                        help='How many threads will be running.')    parser.add_argument("--engine", type=str, dest='engine', default='process', choices=('process', 'async'),                        help='process: one process per session (-c), async: coroutine sessions (--concurrency).')    parser.add_argument("--concurrency", type=int, default=100, dest='concurrency',                        help='How many concurrent sessions the async engine will run.')    parser.add_argument("--loops", type=int, default=multiprocessing.cpu_count(), dest='loops',                        help='How many event loop processes the async engine will run, default is cpu count.')    parser.add_argument("-s", "--sleep", type=int, default=0, dest='sleep',                        help='Sleep seconds between each transaction. ')    parser.add_argument('-u', '--users', dest='users', type=int,                        help='How many users will be created.', default=1000)    parser.add_argument('-f', '--friends', dest='friends', type=int,                        help='How many friends each user will be created.', default=50)    parser.add_argument('-g', '--groups', dest='groups', type=int,                        help='How many groups each user will be created.', default=5)    parser.add_argument('--members', dest='members', type=int,                        help='How many members each group will be created.', default=100)    parser.add_argument('--bulk', dest='bulk', action='store_true', default=False,                        help='Create users, friends and groups with multi-row batch inserts.')    parser.add_argument('--batch-size', dest='batch_size', type=int, default=1000,                        help='How many rows each batch insert will write in bulk mode, '                             'and how many journal records each query checks in -m verify.')    parser.add_argument('-b', '--hongbaos', dest='hongbaos', type=int,                        help='How many friends each user will be created.', default=5)    parser.add_argument('--routing', dest='routing', type=str, default='random', choices=ConnectionPool.ROUTINGS,                        help='How to choose a [serverN] section when connecting: random,round_robin,least_loaded. '                             'least_loaded counts the connections in use by each worker, ties start from the worker number.')    parser.add_argument('--pool-size', dest='pool_size', type=int, default=None,                        help='How many idle connections each worker keeps per server, '                             'overrides pool_size in hongbao.cnf, default is pool_size in hongbao.cnf or 1.')    parser.add_argument('--no-member-index', dest='member_index', action='store_false', default=True,                        help='Query group_member before each hongbao instead of using the client-side member index.')    parser.add_argument('--index-refresh', dest='index_refresh', type=int, default=10,                        help='Seconds between incremental refreshes of the client-side member index.')    parser.add_argument('--hot-groups', dest='hot_groups', type=int, default=0,                        help='Send a share of hongbaos to this many groups to measure hot row lock contention, '                             'needs the member index.')    parser.add_argument('--hot-share', dest='hot_share', type=float, default=0.5,                        help='Share of hongbaos sent to the hot groups.')    parser.add_argument('--stats-interval', dest='stats_interval', type=int, default=5,                        help='Seconds between tps/latency reports of all workers.')    parser.add_argument('--stats-output', dest='stats_output', type=str, default=None,                        help='Write the final stats summary to this file, .csv for csv, otherwise json.')    parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=10000,                        help='How many primary key values each check chunk covers.')    parser.add_argument('--init-balance', dest='init_balance', type=int, default=10000000,                        help='Initial balance of each user, the check expects balance + bank + sent - received to equal it.')    parser.add_argument('--checkpoint', dest='checkpoint', type=str, default=None,                        help='Checkpoint file of the consistency check.')    parser.add_argument('--incremental', dest='incremental', action='store_true', default=False,                        help='Only check rows changed since the checkpoint.')    parser.add_argument('--journal', dest='journal', type=str, default=None,                        help='Directory of the commit journal written by each worker and read by -m verify.')    parser.add_argument('--fsync-interval', dest='fsync_interval', type=float, default=1,                        help='Seconds between fsyncs of the commit journal.')    parser.add_argument('--seed', dest='seed', type=int, default=None,                        help='Random seed, each worker gets its own reproducible stream of generated data.')    parser.add_argument("-l", '--level', type=int, dest='log_level', default=logging.INFO,                        help='logging level: CRITICAL = 50, ERROR = 40, WARNING = 30, INFO = 20, DEBUG = 10')    parser.add_argument('-h', '--help', dest='help', action='store_true', help='help information', default=False)    return parserdef command_line_args(args):    need_print_help = False if args else True    parser = parse_args()    args = parser.parse_args(args)    if args.help or need_print_help:        parser.print_help()        sys.exit(1)    if not args.method:        raise ValueError('The method must be specified and not empty.')    if args.method == "verify" and not args.journal:        raise ValueError('The --journal directory must be specified for -m verify.')    if args.engine == "async" and (args.bulk or args.pool_size is not None):        # 协程引擎每个会话一个连接,逐行事务;批量造数使用进程引擎        raise ValueError('--bulk and --pool-size are not supported by --engine async, use --engine process.')    if args.hot_groups and not args.member_index:        raise ValueError('--hot-groups picks hot groups from the member index and cannot be used with --no-member-index.')    return argsdef create_users_task(name, level, users=5, friends=20, groups=2, groups_members=30, sleep=0,                      bulk=False, batch_size=1000, routing="random", pool_size=None, stats_queue=None,                      journal_dir=None, fsync_interval=1, seed=None):    start = time.time()    log_name = os.path.basename(__file__).replace(".py", "") + "_" + str(name)    logger = init_logger(log_name=log_name, level=level)    logger.debug('Run task %s (%s)...' % (name, os.getpid()))    pool = get_pool(routing=routing, size=pool_size, start=name, logger=logger)    stats = Stats(stats_queue)    pm = HongbaoManager(logger=logger, pool=pool, stats=stats)    pm.random_stream = seed_worker(seed, name)    if journal_dir:        pm.journal = Journal.for_worker(journal_dir, name, fsync_interval=fsync_interval)    if bulk:        pm.create_users_bulk(users=users, friends=friends, groups=groups, groups_members=groups_members,                             batch_size=batch_size)    else:        pm.create_users(users=users, friends=friends, groups=groups, groups_members=groups_members, sleep=sleep)    stats.flush()    if pm.journal:        pm.journal.close()    end = time.time()    logger.debug('Task %s runs %0.2f seconds.' % (name, (end - start)))def create_hongbaos(name, level, users=100, hongbaos=5, sleep=0, routing="random", pool_size=None,                    member_index=True, index_refresh=10, stats_queue=None, journal_dir=None, fsync_interval=1,                    seed=None, hot_groups=0, hot_share=0):    start = time.time()    log_name = os.path.basename(__file__).replace(".py", "") + "_" + str(name)    logger = init_logger(log_name=log_name, level=level)    logger.debug('Run task %s (%s)...' % (name, os.getpid()))    pool = get_pool(routing=routing, size=pool_size, start=name, logger=logger)    stats = Stats(stats_queue)    pm = HongbaoManager(logger=logger, pool=pool, stats=stats)    pm.random_stream = seed_worker(seed, name)    if journal_dir:        pm.journal = Journal.for_worker(journal_dir, name, fsync_interval=fsync_interval)    pm.create_hongbaos(users=users, hongbaos=hongbaos, sleep=sleep, member_index=member_index,                       refresh_interval=index_refresh, hot_groups=hot_groups, hot_share=hot_share)    stats.flush()    if pm.journal:        pm.journal.close()    end = time.time()    logger.debug('Task %s runs %0.2f seconds.' % (name, (end - start)))def verify_journal(level, journal_dir, batch_size=1000):    """用提交日志核对数据库,报告已确认但丢失,未确认但存在的事务"""    logger = init_logger(level=level)    result = JournalVerifier(MyDAO(logger=logger), batch_size).verify(journal_dir)    logger.info(u"核对事务: %d, 未确认且不存在: %d" % (result["checked"], result["unacked_absent"]))    logger.info(u"已确认但丢失: %d %s" % (len(result["lost"]), " ".join(result["lost"])))    logger.info(u"未确认但存在: %d %s" % (len(result["unacked_present"]), " ".join(result["unacked_present"])))    return resultif __name__ == '__main__':    args = command_line_args(sys.argv[1:])    method = args.method    max_threads = args.threads    log_level = args.log_level    if method == "check":        from hongbao_checker import run_check        bad_rows = run_check(log_level, max_threads, args.chunk_size, args.init_balance, args.checkpoint,                             args.incremental)        sys.exit(1 if any(bad_rows.values()) else 0)    if method == "verify":        result = verify_journal(log_level, args.journal, args.batch_size)        sys.exit(1 if result["lost"] else 0)    stats_queue = multiprocessing.Manager().Queue()    reporter = StatsReporter(stats_queue, args.stats_interval, args.stats_output)    reporter.start()    results = []    if args.engine == "async":        from hongbao_async import run_sessions, split_sessions        p = Pool(args.loops)        for i, sessions in enumerate(split_sessions(args.concurrency, args.loops)):            if sessions:                results.append(p.apply_async(run_sessions, args=(                    i, log_level, method, sessions, args.users, args.friends, args.groups, args.members,                    args.hongbaos, args.sleep, args.routing, args.member_index, args.index_refresh, stats_queue,                    args.journal, args.fsync_interval, args.seed, args.hot_groups, args.hot_share)))    else:        p = Pool(max_threads)        for i in range(max_threads):            if method == "user":                results.append(p.apply_async(create_users_task, args=(                    i, log_level, args.users, args.friends, args.groups, args.members, args.sleep, args.bulk,                    args.batch_size, args.routing, args.pool_size, stats_queue, args.journal,                    args.fsync_interval, args.seed)))            elif method == "hongbao":                results.append(p.apply_async(create_hongbaos, args=(                    i, log_level, args.users, args.hongbaos, args.sleep, args.routing, args.pool_size,                    args.member_index, args.index_refresh, stats_queue, args.journal, args.fsync_interval,                    args.seed, args.hot_groups, args.hot_share)))    p.close()    p.join()    reporter.stop()    # worker异常退出时输出异常,并以非0状态退出    failed_workers = 0    for result in results:        try:            result.get()        except Exception:            traceback.print_exc()            failed_workers += 1    if failed_workers:        print('%d workers failed.' % failed_workers)        sys.exit(1)    print('All done.')
\ No newline at end of file
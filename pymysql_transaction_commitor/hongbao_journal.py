@@ -0,0 +1 @@
+#!/usr/bin/env python# coding=utf-8import globimport osimport threadingimport time# 记录格式,每行一条,字段以tab分隔:# H  A|U  确认时间  reid  uid  gid  amount  uid:amount,uid:amount...# G  A|U  确认时间  gid   create_uid  uid,uid...# A: commit已确认, U: commit已发送但未收到确认(如连接断开),提交结果未知HONGBAO, GROUP = "H", "G"ACKED, UNACKED = "A", "U"class Journal:    """    事务提交日志    每个worker一个追加写文件,记录先追加到内存缓冲,由后台线程每fsync_interval秒写入文件并fsync,    协程引擎中fsync不会阻塞事件循环    """    def __init__(self, path, fsync_interval=1, buffer_size=1048576):        self.path = path        self.fsync_interval = fsync_interval        self.file = open(path, "a", buffer_size)        self.lines = []        self.lock = threading.Lock()        self.closing = threading.Event()        self.syncer = threading.Thread(target=self._sync_loop)        self.syncer.daemon = True        self.syncer.start()    @classmethod    def for_worker(cls, journal_dir, name, **kw):        if not os.path.isdir(journal_dir):            try:                os.makedirs(journal_dir)            except OSError:                # 其它worker已经创建                pass        return cls(os.path.join(journal_dir, "journal_%s_%d.log" % (name, os.getpid())), **kw)    def write(self, fields):        line = "\t".join(fields) + "\n"        with self.lock:            self.lines.append(line)    def hongbao(self, reid, uid, gid, amount, details, acked=True):        """details: [(uid, amount)]"""        self.write((HONGBAO, ACKED if acked else UNACKED, "%.6f" % time.time(), str(reid), str(uid), str(gid),                    str(amount), ",".join("%s:%s" % detail for detail in details)))    def group(self, gid, create_uid, members, acked=True):        self.write((GROUP, ACKED if acked else UNACKED, "%.6f" % time.time(), str(gid), str(create_uid),                    ",".join(str(uid) for uid in members)))    def _sync_loop(self):        while not self.closing.wait(self.fsync_interval):            self.sync()    def sync(self):        """把缓冲的记录写入文件并fsync,只在后台线程或close中调用"""        with self.lock:            lines, self.lines = self.lines, []        if lines:            self.file.write("".join(lines))            self.file.flush()            os.fsync(self.file.fileno())    def close(self):        if not self.file.closed:            self.closing.set()            self.syncer.join()            self.sync()            self.file.close()def read_journal(journal_dir):    """按文件顺序读出所有记录,忽略最后不完整的行"""    for path in sorted(glob.glob(os.path.join(journal_dir, "journal_*.log"))):        with open(path) as f:            for line in f:                if line.endswith("\n"):                    yield line.rstrip("\n").split("\t")def parse_pairs(text):    return sorted(tuple(int(v) for v in pair.split(":")) for pair in text.split(",") if pair)def parse_ids(text):    return sorted(int(v) for v in text.split(",") if v)class JournalVerifier:    """    用提交日志核对切换后的数据库    lost: 已确认提交但数据库中不存在或内容不一致    unacked_present: 未确认提交但数据库中存在    """    def __init__(self, dao, batch_size=1000):        self.dao = dao        self.batch_size = batch_size        self.result = {"checked": 0, "lost": [], "unacked_present": [], "unacked_absent": 0}    def verify(self, journal_dir):        batches = {HONGBAO: [], GROUP: []}        for record in read_journal(journal_dir):            batch = batches.get(record[0])            if batch is None:                continue            batch.append(record)            if len(batch) >= self.batch_size:                self.verify_batch(record[0], batch)                batches[record[0]] = []        for kind, batch in batches.items():            if batch:                self.verify_batch(kind, batch)        return self.result    def verify_batch(self, kind, records):        if kind == HONGBAO:            found = self.query_hongbaos([int(record[3]) for record in records])            expected = lambda record: (int(record[4]), int(record[5]), int(record[6]), parse_pairs(record[7]))        else:            found = self.query_groups([int(record[3]) for record in records])            expected = lambda record: (int(record[4]), parse_ids(record[5]))        for record in records:            self.result["checked"] += 1            key = "%s:%s" % (kind, record[3])            actual = found.get(int(record[3]))            if record[1] == ACKED:                if actual != expected(record):                    self.result["lost"].append(key)            elif actual is not None:                self.result["unacked_present"].append(key)            else:                self.result["unacked_absent"] += 1    def query_hongbaos(self, reids):        sql_query_hongbao = "select reid,uid,gid,amount from `hongbao` where reid in (%s)"        sql_query_hongbao_detail = "select reid,uid,amount from `hongbao_detail` where reid in (%s)"        placeholders = ",".join(["%s"] * len(reids))        details = {}        for row in self.dao.query2list(sql_query_hongbao_detail % placeholders, reids):            details.setdefault(row["reid"], []).append((row["uid"], row["amount"]))        return dict((row["reid"], (row["uid"], row["gid"], row["amount"], sorted(details.get(row["reid"], []))))                    for row in self.dao.query2list(sql_query_hongbao % placeholders, reids))    def query_groups(self, gids):        sql_query_group = "select gid,create_uid from `group` where gid in (%s)"        sql_query_group_member = "select gid,uid from `group_member` where gid in (%s)"        placeholders = ",".join(["%s"] * len(gids))        members = {}        for row in self.dao.query2list(sql_query_group_member % placeholders, gids):            members.setdefault(row["gid"], []).append(row["uid"])        return dict((row["gid"], (row["create_uid"], sorted(members.get(row["gid"], []))))                    for row in self.dao.query2list(sql_query_group % placeholders, gids))
\ No newline at end of file
@@ -1 +1 @@
-#!/usr/bin/env python# coding=utf-8import loggingimport randomimport tracebackimport numpy as npimport my_util as muimport timefrom my_dao import MyDAOfrom my_util import init_loggerclass HongbaoManager(MyDAO):    """    红包Manager    """    def __init__(self, *args, **kw):        MyDAO.__init__(self, *args, **kw)    def create_user(self, balance=10000000):        """        创建用户和银行余额        :return: user_id        """        sql_insert_user = "insert into `user` " \                          "set uname = %s, birth_day = %s, addr_province = %s, addr_city = %s, friends = 0 "        sql_insert_user_bank = "insert into `user_bank` set uid = %s, balance = %s"        user = (mu.random_uname(), mu.random_birth_day(), mu.random_addr_province(), mu.random_addr_city())        conn = self.trx_begin()        try:            with conn.cursor() as cursor:                cursor.execute(sql_insert_user, user)                insert_user_id = cursor.lastrowid                cursor.execute(sql_insert_user_bank, (insert_user_id, balance))                conn.commit()        except:            self.logger.error(traceback.format_exc())            conn.rollback()            return False        return insert_user_id    def create_user_friends(self, uid, count=10):        """创建好友"""        sql_query_user = "select uid,uname,friends from `user` where uid = %s"        sql_query_user_count = "select min(uid) min_uid,max(uid) max_uid from `user`"        sql_query_user_friends = """            select uid from `user` a where uid in (%s) and uid not in (                select ufid from user_friends b where b.uid = %s            )        """        sql_insert_user_friends = "insert into user_friends set uid = %s, ufid = %s"        sql_update_user = "update `user` set  friends = friends + %s where uid = %s"        user = self.query2one(sql_query_user, (uid,))        if not user:            return False        # 随机count个用户id        uid_range = self.query2one(sql_query_user_count)        random_user_friends_uids = []        for _ in range(count):            random_user_friends_uids.append(str(random.randint(uid_range["min_uid"], uid_range["max_uid"])))        user_friends = self.query2list(sql_query_user_friends % (",".join(random_user_friends_uids), uid))        # 彼此添加好友        conn = self.trx_begin()        try:            with conn.cursor() as cursor:                add_friends = 0                for friend in user_friends:                    if uid == friend["uid"]:                        continue                    cursor.execute(sql_insert_user_friends, (uid, friend["uid"]))                    cursor.execute(sql_insert_user_friends, (friend["uid"], uid))                    cursor.execute(sql_update_user, (1, friend["uid"],))                    add_friends += 1                cursor.execute(sql_update_user, (add_friends, uid))                conn.commit()        except:            self.logger.error(traceback.format_exc())            conn.rollback()            return False        return user, self.query2one(sql_query_user, (uid,))    def create_group(self, uid, members=50):        """建群"""        sql_query_group = "select gid,create_uid,gname,group_members from `group` where gid = %s"        sql_query_user = "select uid,uname,friends from `user` where uid = %s"        sql_query_user_friends_by_friends = """            select ufid from `user_friends` where uid = %s            union all            select b.ufid from `user_friends` a, `user_friends` b where a.ufid = b.uid and a.uid = %s        """        sql_insert_group = "insert into `group` set create_uid = %s, gname = %s "        sql_update_group = "update `group` set group_members = group_members + %s where gid = %s"        sql_insert_group_member = "insert into `group_member` set gid = %s, uid = %s "        user = self.query2one(sql_query_user, (uid,))        if not user:            return False        # 获取用户好友,及好友的好友,并随机选择一部分后,再去掉重复的id        user_friends_by_friends = self.query2list(sql_query_user_friends_by_friends, (uid, uid))        # 总成员数不能大于 实际好友总数        members = members if members <= len(user_friends_by_friends) else len(user_friends_by_friends)        random_group_member = np.random.choice(user_friends_by_friends, members, replace=False)        unique_group_member = {}.fromkeys([val["ufid"] for val in random_group_member]).keys()        # 开始事务        conn = self.trx_begin()        try:            with conn.cursor() as cursor:                cursor.execute(sql_insert_group, (uid, mu.random_gname()))                insert_group_id = cursor.lastrowid                for member_uid in unique_group_member:                    cursor.execute(sql_insert_group_member, (insert_group_id, member_uid))                cursor.execute(sql_update_group, (len(unique_group_member), insert_group_id))                conn.commit()        except:            self.logger.error(traceback.format_exc())            conn.rollback()            return False        return self.query2one(sql_query_group, (insert_group_id,))    def create_hongbao(self, uid, hongbao_amount=10000):        """发红包"""        sql_query_user = "select uid,balance from `user` where uid = %s"        sql_query_group = "select gid from `group_member` where uid = %s"        sql_query_group_members = "select uid from `group_member` where gid = %s order by rand()"        sql_query_hongbao = "select * from `hongbao` where reid = %s"        sql_insert_hongbao = "insert into hongbao set uid = %s, gid = %s, amount = %s"        sql_insert_hongbao_detail = "insert into hongbao_detail set reid = %s, uid = %s, amount = %s"        sql_update_user = "update `user` set balance = balance + %s where uid = %s"        sql_update_hongbao = "update hongbao " \                             "set best_luck_uid = %s, max_mount = %s, pickup_users = %s where reid = %s"        # 检查帐户余额,没有就先冲值        user = self.query2one(sql_query_user, (uid,))        if not user:            self.logger.error("[%s]用户不存在" % (uid, ))            return False        if user["balance"] < hongbao_amount:            self.user_add_balance(uid, hongbao_amount)        # 随机选择一个群gid        group_list = self.query2list(sql_query_group, (uid,))        gid = random.choice(group_list)["gid"]        group_members = self.query2list(sql_query_group_members, (gid,))        insert_reid, best_luck_uid, max_mount, pickup_users = (0, 0, 0, 0)        # 开始事务        conn = self.trx_begin()        try:            with conn.cursor() as cursor:                # 发红包                cursor.execute(sql_update_user, (-1 * hongbao_amount, uid))                cursor.execute(sql_insert_hongbao, (uid, gid, hongbao_amount))                insert_reid = cursor.lastrowid                amount = hongbao_amount                # 领红包                for member in group_members:                    member_uid = member["uid"]                    # 累计人数                    pickup_users += 1                    if pickup_users == len(group_members):                        # 最后一个人分得红包所剩全部金额                        pickup_amount, amount = amount, 0                    else:                        # 随机分配金额,单位为分                        pickup_amount = random.randint(1, amount)                        amount -= pickup_amount                    # 记录最佳手气uid                    if pickup_amount > max_mount:                        max_mount = pickup_amount                        best_luck_uid = member_uid                    # 收红包的人加余额                    cursor.execute(sql_update_user, (pickup_amount, member_uid))                    # 记录红包记录                    cursor.execute(sql_insert_hongbao_detail, (insert_reid, member_uid, pickup_amount))                    if amount == 0:                        break                # 更新总计信息                cursor.execute(sql_update_hongbao, (best_luck_uid, max_mount, pickup_users, insert_reid))                conn.commit()        except:            self.logger.error(traceback.format_exc())            conn.rollback()            return False        return self.query2one(sql_query_hongbao, (insert_reid,))    def user_add_balance(self, uid, amount):        """用户冲值"""        sql_update_user_bank = "update `user_bank` set balance=balance - %s where uid = %s"        sql_update_user = "update `user` set  balance=balance + %s where uid = %s"        return self.execute([            sql_update_user_bank % (amount, uid),            sql_update_user % (amount, uid)        ])    def user_bank_add_balance(self, uid, amount):        """用户提现"""        sql_update_user_bank = "update `user_bank` set balance=balance + %s where uid = %s"        sql_update_user = "update `user` set  balance=balance - %s where uid = %s"        return self.execute([            sql_update_user_bank % (amount, uid),            sql_update_user % (amount, uid)        ])    def create_users(self, users=100, friends=20, groups=5, groups_members=60, sleep=0):        """创建用户,好友,群"""        user_ids = []        self.logger.info(u"开始创建用户:%d" % users)        for _ in range(users):            user_id = self.create_user()            if user_id is False:                self.logger.error(u"创建用户失败")            else:                user_ids.append(user_id)        self.logger.info(u"开始创建好友:%d" % friends)        for i, uid in enumerate(user_ids):            if self.create_user_friends(uid, friends) is False:                self.logger.error(u"创建好友失败")            self.logger.info(u"第[%s/%s]个用户[%s]创建好友完成" % (i, users, uid))        self.logger.info(u"开始创建群:%d,成员:%d" % (groups, groups_members) )        for i, uid in enumerate(user_ids):            successed = 0            for group in range(0, groups):                if self.create_group(uid, groups_members) is False:                    self.logger.error(u"创建群失败")                else:                    successed += 1                if sleep:                    time.sleep(sleep)            self.logger.info(u"第[%s/%s]个用户[%s]建群完成%s个" % (i, users, uid, successed))    def create_hongbaos(self, users, hongbaos, sleep=0):        """发红包"""        self.logger.info(u"开始发红包,users/hongbaos:%s/%s" % (users, hongbaos))        successed, failed = 0, 0        range_user_id = self.query2one("select min(uid) begin_uid, max(uid) end_uid from `user`")        for i in range(0, users):            self.logger.debug(u"随机用户id: %s - %s" % (range_user_id["begin_uid"], range_user_id["end_uid"]))            uid = random.randint(range_user_id["begin_uid"], range_user_id["end_uid"])            user_successed = 0            for _ in range(0, hongbaos):                if self.create_hongbao(uid):                    successed += 1                    user_successed += 1                else:                    self.logger.error(u"发红包失败")                    failed += 1                if sleep:                    time.sleep(sleep)            self.logger.info(u" [%s/%s] 用户[%s]发红包%s个" % (i+1, users, uid, user_successed))        return successed, failedif __name__ == '__main__':    logger = init_logger(level=logging.INFO)    pm = HongbaoManager(logger=logger)    # pm.set_general_log(True)    pm.create_users(users=50, friends=20, groups=2, groups_members=30)    # pm.create_user()
\ No newline at end of file
+#!/usr/bin/env python# coding=utf-8import loggingimport randomimport tracebackimport numpy as npimport timefrom member_index import get_member_indexfrom my_dao import MyDAOfrom my_random import RandomStreamfrom my_util import init_loggerclass HongbaoManager(MyDAO):    """    红包Manager    """    def __init__(self, *args, **kw):        MyDAO.__init__(self, *args, **kw)        # 群成员客户端索引,为空时发红包前查询group_member        self.member_index = None        # 事务提交日志,为空时不记录        self.journal = None        # 预生成的用户名,群名,生日,地址和红包拆分        self.random_stream = RandomStream()    def create_user(self, balance=10000000):        """        创建用户和银行余额        :return: user_id        """        sql_insert_user = "insert into `user` " \                          "set uname = %s, birth_day = %s, addr_province = %s, addr_city = %s, friends = 0 "        sql_insert_user_bank = "insert into `user_bank` set uid = %s, balance = %s"        rs = self.random_stream        user = (rs.uname(), rs.birth_day(), rs.addr_province(), rs.addr_city())        conn = self.trx_begin("create_user")        try:            with conn.cursor() as cursor:                cursor.execute(sql_insert_user, user)                insert_user_id = cursor.lastrowid                cursor.execute(sql_insert_user_bank, (insert_user_id, balance))                self.trx_end(conn)        except:            self.logger.error(traceback.format_exc())            self.trx_rollback(conn)            return False        return insert_user_id    def create_user_friends(self, uid, count=10):        """创建好友"""        sql_query_user = "select uid,uname,friends from `user` where uid = %s"        sql_query_user_count = "select min(uid) min_uid,max(uid) max_uid from `user`"        sql_query_user_friends = """            select uid from `user` a where uid in (%s) and uid not in (                select ufid from user_friends b where b.uid = %s            )        """        sql_insert_user_friends = "insert into user_friends set uid = %s, ufid = %s"        user = self.query2one(sql_query_user, (uid,))        if not user:            return False        # 随机count个用户id        uid_range = self.query2one(sql_query_user_count)        random_user_friends_uids = []        for _ in range(count):            random_user_friends_uids.append(random.randint(uid_range["min_uid"], uid_range["max_uid"]))        user_friends = self.query2list(sql_query_user_friends % (",".join(["%s"] * count), "%s"),                                       random_user_friends_uids + [uid])        # 彼此添加好友,好友数按uid顺序一次更新        friend_uids = [friend["uid"] for friend in user_friends if friend["uid"] != uid]        friends_deltas = dict((friend_uid, 1) for friend_uid in friend_uids)        friends_deltas[uid] = len(friend_uids)        for attempt in range(self.max_trx_retries + 1):            conn = self.trx_begin("create_user_friends")            try:                with conn.cursor() as cursor:                    for friend_uid in friend_uids:                        cursor.execute(sql_insert_user_friends, (uid, friend_uid))                        cursor.execute(sql_insert_user_friends, (friend_uid, uid))                    cursor.execute(*self._update_user_sql("friends", friends_deltas))                    self.trx_end(conn)                break            except:                if self.trx_retry(conn, attempt):                    continue                self.logger.error(traceback.format_exc())                self.trx_rollback(conn)                return False        return user, self.query2one(sql_query_user, (uid,))    def create_group(self, uid, members=50):        """建群"""        sql_query_group = "select gid,create_uid,gname,group_members from `group` where gid = %s"        sql_query_user = "select uid,uname,friends from `user` where uid = %s"        sql_query_user_friends_by_friends = """            select ufid from `user_friends` where uid = %s            union all            select b.ufid from `user_friends` a, `user_friends` b where a.ufid = b.uid and a.uid = %s        """        sql_insert_group = "insert into `group` set create_uid = %s, gname = %s "        sql_update_group = "update `group` set group_members = group_members + %s where gid = %s"        sql_insert_group_member = "insert into `group_member` set gid = %s, uid = %s "        user = self.query2one(sql_query_user, (uid,))        if not user:            return False        # 获取用户好友,及好友的好友,并随机选择一部分后,再去掉重复的id        user_friends_by_friends = self.query2list(sql_query_user_friends_by_friends, (uid, uid))        # 总成员数不能大于 实际好友总数        members = members if members <= len(user_friends_by_friends) else len(user_friends_by_friends)        random_group_member = np.random.choice(user_friends_by_friends, members, replace=False)        unique_group_member = {}.fromkeys([val["ufid"] for val in random_group_member]).keys()        # 开始事务        conn = self.trx_begin("create_group")        try:            with conn.cursor() as cursor:                cursor.execute(sql_insert_group, (uid, self.random_stream.gname()))                insert_group_id = cursor.lastrowid                for member_uid in unique_group_member:                    cursor.execute(sql_insert_group_member, (insert_group_id, member_uid))                cursor.execute(sql_update_group, (len(unique_group_member), insert_group_id))                self.trx_end(conn)        except:            self.logger.error(traceback.format_exc())            if self.journal and self.commit_sent:                self.journal.group(insert_group_id, uid, unique_group_member, acked=False)            self.trx_rollback(conn)            return False        if self.journal:            self.journal.group(insert_group_id, uid, unique_group_member)        return self.query2one(sql_query_group, (insert_group_id,))    def create_hongbao(self, uid, hongbao_amount=10000, gid=None):        """发红包,gid为空时随机选择用户所在的一个群"""        sql_query_user = "select uid,balance from `user` where uid = %s"        sql_query_group = "select gid from `group_member` where uid = %s"        sql_query_group_members = "select uid from `group_member` where gid = %s order by rand()"        sql_query_hongbao = "select * from `hongbao` where reid = %s"        sql_insert_hongbao = "insert into hongbao set uid = %s, gid = %s, amount = %s"        sql_insert_hongbao_detail = "insert into hongbao_detail (reid, uid, amount) values (%s, %s, %s)"        sql_update_hongbao = "update hongbao " \                             "set best_luck_uid = %s, max_mount = %s, pickup_users = %s where reid = %s"        # 检查帐户余额,没有就先冲值        user = self.query2one(sql_query_user, (uid,))        if not user:            self.logger.error("[%s]用户不存在" % (uid, ))            return False        if user["balance"] < hongbao_amount:            self.user_add_balance(uid, hongbao_amount)        # 随机选择一个群gid,群成员随机排序        if self.member_index:            gid = gid if gid else self.member_index.random_gid(uid)            if gid is None:                self.logger.error("[%s]用户没有群" % (uid, ))                return False            group_member_uids = self.member_index.shuffled_members(gid)        else:            if not gid:                group_list = self.query2list(sql_query_group, (uid,))                gid = random.choice(group_list)["gid"]            group_member_uids = [member["uid"] for member in self.query2list(sql_query_group_members, (gid,))]        # 领红包,随机分配金额,单位为分,每人至少1分        pickup_amounts = self.random_stream.split(hongbao_amount, len(group_member_uids))        details = list(zip(group_member_uids, pickup_amounts))        pickup_users = len(details)        # 记录最佳手气uid        best_luck_uid, max_mount = max(details, key=lambda detail: detail[1]) if details else (0, 0)        # 发红包的人减余额,收红包的人加余额        balance_deltas = {uid: -1 * hongbao_amount}        for member_uid, pickup_amount in details:            balance_deltas[member_uid] = balance_deltas.get(member_uid, 0) + pickup_amount        insert_reid = 0        for attempt in range(self.max_trx_retries + 1):            # 开始事务            conn = self.trx_begin("create_hongbao")            try:                with conn.cursor() as cursor:                    cursor.execute(sql_insert_hongbao, (uid, gid, hongbao_amount))                    insert_reid = cursor.lastrowid                    # 记录红包记录                    if details:                        cursor.executemany(sql_insert_hongbao_detail,                                           [(insert_reid, member_uid, amount) for member_uid, amount in details])                    # 更新总计信息                    cursor.execute(sql_update_hongbao, (best_luck_uid, max_mount, pickup_users, insert_reid))                    # 余额放在最后按uid顺序一次更新,减少热点行锁持有时间,并发红包之间不会死锁                    cursor.execute(*self._update_user_sql("balance", balance_deltas))                    self.trx_end(conn)                break            except:                if self.trx_retry(conn, attempt):                    continue                self.logger.error(traceback.format_exc())                if self.journal and self.commit_sent:                    # commit已发送但未收到确认,提交结果未知                    self.journal.hongbao(insert_reid, uid, gid, hongbao_amount, details, acked=False)                self.trx_rollback(conn)                return False        if self.journal:            self.journal.hongbao(insert_reid, uid, gid, hongbao_amount, details)        return self.query2one(sql_query_hongbao, (insert_reid,))    def user_add_balance(self, uid, amount):        """用户冲值"""        sql_update_user_bank = "update `user_bank` set balance=balance - %s where uid = %s"        sql_update_user = "update `user` set  balance=balance + %s where uid = %s"        return self.execute([            (sql_update_user_bank, (amount, uid)),            (sql_update_user, (amount, uid))        ], "user_add_balance")    def user_bank_add_balance(self, uid, amount):        """用户提现"""        sql_update_user_bank = "update `user_bank` set balance=balance + %s where uid = %s"        sql_update_user = "update `user` set  balance=balance - %s where uid = %s"        return self.execute([            (sql_update_user_bank, (amount, uid)),            (sql_update_user, (amount, uid))        ], "user_bank_add_balance")    @staticmethod    def _update_user_sql(column, deltas):        """        按uid排序的 update ... case 语句,一条语句按主键顺序加锁        :param deltas: {uid: 增量}        :return: sql, para        """        uids = sorted(deltas)        sql = "update `user` set %s = %s + case uid %s end where uid in (%s)" % (            column, column, " ".join(["when %s then %s"] * len(uids)), ",".join(["%s"] * len(uids)))        para = []        for uid in uids:            para.extend((uid, deltas[uid]))        return sql, para + uids    def create_users(self, users=100, friends=20, groups=5, groups_members=60, sleep=0):        """创建用户,好友,群"""        user_ids = []        self.logger.info(u"开始创建用户:%d" % users)        for _ in range(users):            user_id = self.call_available(self.create_user)            if user_id is False:                self.logger.error(u"创建用户失败")            else:                user_ids.append(user_id)        self.logger.info(u"开始创建好友:%d" % friends)        for i, uid in enumerate(user_ids):            if self.call_available(self.create_user_friends, uid, friends) is False:                self.logger.error(u"创建好友失败")            self.logger.info(u"第[%s/%s]个用户[%s]创建好友完成" % (i, users, uid))        self.logger.info(u"开始创建群:%d,成员:%d" % (groups, groups_members) )        for i, uid in enumerate(user_ids):            successed = 0            for group in range(0, groups):                if self.call_available(self.create_group, uid, groups_members) is False:                    self.logger.error(u"创建群失败")                else:                    successed += 1                if sleep:                    time.sleep(sleep)            self.logger.info(u"第[%s/%s]个用户[%s]建群完成%s个" % (i, users, uid, successed))    def create_users_bulk(self, users=100, friends=20, groups=5, groups_members=60, batch_size=1000):        """        批量创建用户,好友,群        好友关系和群成员在客户端生成,按batch_size多行写入,每批一个事务        :return: 各表写入统计 {table: [rows, seconds]}        """        stats = {}        self.logger.info(u"开始批量创建用户:%d,批量大小:%d" % (users, batch_size))        user_ids = self._bulk_create_users(users, batch_size, stats)        self.logger.info(u"开始批量创建好友:%d" % friends)        indptr, indices = self._bulk_create_user_friends(user_ids, friends, batch_size, stats)        self.logger.info(u"开始批量创建群:%d,成员:%d" % (groups, groups_members))        self._bulk_create_groups(user_ids, indptr, indices, groups, groups_members, batch_size, stats)        for table in ("user", "user_bank", "user_friends", "group", "group_member"):            rows, seconds = stats.get(table, (0, 0))            self.logger.info(u"表[%s]写入%d行,耗时%0.2f秒,%0.0f行/秒"                             % (table, rows, seconds, rows / seconds if seconds else 0))        return stats    @staticmethod    def _bulk_stat(stats, elapsed, **table_rows):        """累计每张表的写入行数和事务耗时"""        for table, rows in table_rows.items():            stat = stats.setdefault(table, [0, 0.0])            stat[0] += rows            stat[1] += elapsed    def _bulk_create_users(self, users, batch_size, stats, balance=10000000):        """批量创建用户和银行余额"""        sql_insert_user = "insert into `user` (uname, birth_day, addr_province, addr_city, friends) " \                          "values (%s, %s, %s, %s, %s)"        sql_query_user_ids = "select uid from `user` where uname in (%s)"        sql_insert_user_bank = "insert into `user_bank` (uid, balance) values (%s, %s)"        rs = self.random_stream        user_ids = []        for start in range(0, users, batch_size):            count = min(batch_size, users - start)            rows = list(zip(rs.take("uname", count), rs.take("birth_day", count), rs.take("addr_province", count),                            rs.take("addr_city", count), [0] * count))            begin = time.time()            conn = self.trx_begin("bulk_create_users")            try:                with conn.cursor() as cursor:                    cursor.executemany(sql_insert_user, rows)                    # 多行insert不保证自增id连续,按uname取回uid                    cursor.execute(sql_query_user_ids % ",".join(["%s"] * count), [row[0] for row in rows])                    batch_user_ids = [row["uid"] for row in cursor.fetchall()]                    cursor.executemany(sql_insert_user_bank, [(uid, balance) for uid in batch_user_ids])                    self.trx_end(conn)            except:                self.logger.error(traceback.format_exc())                self.trx_rollback(conn)                self.logger.error(u"批量创建用户失败")                continue            user_ids.extend(batch_user_ids)            self._bulk_stat(stats, time.time() - begin, user=count, user_bank=count)            self.logger.info(u"[%s/%s]用户创建完成" % (start + count, users))        return user_ids    def _bulk_create_user_friends(self, user_ids, friends, batch_size, stats):        """        批量创建好友        在客户端生成对称的好友关系,每批事务内同时写入好友记录和user.friends计数        :return: 好友邻接表(CSR格式) indptr, indices, 下标为user_ids的位置        """        sql_insert_user_friends = "insert into user_friends (uid, ufid) values (%s, %s)"        sql_update_user = "update `user` set friends = friends + %s where uid in (%s)"        n = len(user_ids)        uids = np.array(user_ids, dtype=np.int64)        if n < 2 or friends <= 0:            return np.zeros(n + 1, dtype=np.int64), np.zeros(0, dtype=np.int64)        # 每个用户随机选择friends个好友,去掉自己和重复的好友关系        src = np.repeat(np.arange(n, dtype=np.int64), friends)        dst = np.random.randint(0, n, size=len(src)).astype(np.int64)        keep = src != dst        low, high = np.minimum(src[keep], dst[keep]), np.maximum(src[keep], dst[keep])        pairs = np.unique(low * n + high)        low, high = pairs // n, pairs % n        # 已提交的好友关系,失败批次的好友关系不进入邻接表        committed = np.zeros(len(pairs), dtype=bool)        for start in range(0, len(pairs), batch_size):            a = uids[low[start:start + batch_size]].tolist()            b = uids[high[start:start + batch_size]].tolist()            # 按新增好友数分组,每组一条update            degree = {}            for uid in a + b:                degree[uid] = degree.get(uid, 0) + 1            delta_uids = {}            for uid, delta in degree.items():                delta_uids.setdefault(delta, []).append(uid)            begin = time.time()            conn = self.trx_begin("bulk_create_user_friends")            try:                with conn.cursor() as cursor:                    cursor.executemany(sql_insert_user_friends, list(zip(a, b)) + list(zip(b, a)))                    for delta, delta_uid_list in delta_uids.items():                        cursor.execute(sql_update_user % ("%s", ",".join(["%s"] * len(delta_uid_list))),                                       [delta] + delta_uid_list)                    self.trx_end(conn)            except:                self.logger.error(traceback.format_exc())                self.trx_rollback(conn)                self.logger.error(u"批量创建好友失败")                continue            committed[start:start + batch_size] = True            self._bulk_stat(stats, time.time() - begin, user_friends=2 * len(a))            self.logger.info(u"[%s/%s]好友关系创建完成" % (start + len(a), len(pairs)))        # 客户端好友邻接表,供建群使用,不再回查user_friends        low, high = low[committed], high[committed]        heads = np.concatenate([low, high])        tails = np.concatenate([high, low])        indices = tails[np.argsort(heads, kind="mergesort")]        indptr = np.concatenate([[0], np.cumsum(np.bincount(heads, minlength=n))])        return indptr, indices    def _bulk_create_groups(self, user_ids, indptr, indices, groups, groups_members, batch_size, stats):        """批量建群,成员从用户的好友及好友的好友中随机选择"""        uids = np.array(user_ids, dtype=np.int64)        groups_per_batch = max(1, batch_size // max(groups_members, 1))        pending = []        for i, uid in enumerate(user_ids):            user_friends = indices[indptr[i]:indptr[i + 1]]            candidates = np.unique(np.concatenate(                [user_friends] + [indices[indptr[f]:indptr[f + 1]] for f in user_friends]))            for _ in range(groups):                # 总成员数不能大于 实际好友总数                members = min(groups_members, len(candidates))                member_uids = uids[np.random.choice(candidates, members, replace=False)].tolist() if members else []                pending.append((uid, self.random_stream.gname(), member_uids))                if len(pending) >= groups_per_batch:                    self._bulk_insert_groups(pending, stats)                    pending = []            self.logger.debug(u"第[%s/%s]个用户[%s]建群完成" % (i + 1, len(user_ids), uid))        if pending:            self._bulk_insert_groups(pending, stats)    def _bulk_insert_groups(self, groups, stats):        """在一个事务内写入一批群及其成员"""        sql_insert_group = "insert into `group` (create_uid, gname, group_members) values (%s, %s, %s)"        sql_query_group_ids = "select gid,gname from `group` where gname in (%s)"        sql_insert_group_member = "insert into `group_member` (gid, uid) values (%s, %s)"        begin = time.time()        conn = self.trx_begin("bulk_insert_groups")        try:            with conn.cursor() as cursor:                cursor.executemany(sql_insert_group, [(uid, gname, len(members)) for uid, gname, members in groups])                cursor.execute(sql_query_group_ids % ",".join(["%s"] * len(groups)), [g[1] for g in groups])                gids = dict((row["gname"], row["gid"]) for row in cursor.fetchall())                group_member_rows = [(gids[gname], member_uid) for _, gname, members in groups                                     for member_uid in members]                if group_member_rows:                    cursor.executemany(sql_insert_group_member, group_member_rows)                self.trx_end(conn)        except:            self.logger.error(traceback.format_exc())            self.trx_rollback(conn)            self.logger.error(u"批量创建群失败")            return False        self._bulk_stat(stats, time.time() - begin, group=len(groups), group_member=len(group_member_rows))        return True    def create_hongbaos(self, users, hongbaos, sleep=0, member_index=True, refresh_interval=10,                        hot_groups=0, hot_share=0):        """        发红包        member_index为True时,发红包用户,群和群成员从客户端群成员索引中选择        hot_groups大于0时,hot_share比例的红包由群成员发到gid最小的hot_groups个群,制造热点行锁争用        """        self.logger.info(u"开始发红包,users/hongbaos:%s/%s" % (users, hongbaos))        successed, failed = 0, 0        hot_gids = []        if member_index:            self.member_index = get_member_index(self, refresh_interval)            hot_gids = self.member_index.first_gids(hot_groups)        else:            range_user_id = self.query2one("select min(uid) begin_uid, max(uid) end_uid from `user`")        for i in range(0, users):            if self.member_index:                self.call_available(self.member_index.maybe_refresh, self)                uid = self.member_index.random_uid()            else:                self.logger.debug(u"随机用户id: %s - %s" % (range_user_id["begin_uid"], range_user_id["end_uid"]))                uid = random.randint(range_user_id["begin_uid"], range_user_id["end_uid"])            user_successed = 0            for _ in range(0, hongbaos):                if hot_gids and random.random() < hot_share:                    hot_gid = random.choice(hot_gids)                    result = self.call_available(self.create_hongbao, self.member_index.random_member(hot_gid),                                                 gid=hot_gid)                else:                    result = self.call_available(self.create_hongbao, uid)                if result:                    successed += 1                    user_successed += 1                else:                    self.logger.error(u"发红包失败")                    failed += 1                if sleep:                    time.sleep(sleep)            self.logger.info(u" [%s/%s] 用户[%s]发红包%s个" % (i+1, users, uid, user_successed))        self.logger.info(u"发红包成功%s个,失败%s个,锁冲突重试%s次,放弃%s次"                         % (successed, failed, self.trx_retries, self.trx_aborts))        return successed, failedif __name__ == '__main__':    logger = init_logger(level=logging.INFO)    pm = HongbaoManager(logger=logger)    # pm.set_general_log(True)    pm.create_users(users=50, friends=20, groups=2, groups_members=30)    # pm.create_user()
\ No newline at end of file
@@ -0,0 +1 @@
+#!/usr/bin/env python# coding=utf-8import randomimport timefrom array import arrayimport numpy as npdef build_csr(keys, values):    """    (key, value)对按key分组为CSR格式    :return: 排序去重的keys, indptr, 按key和value排序的values    """    order = np.lexsort((values, keys))    keys, values = keys[order], values[order]    unique_keys, starts = np.unique(keys, return_index=True)    return unique_keys, np.append(starts, len(keys)).astype(np.int64), valuesdef int64_array(values):    """array("q")转换为numpy数组"""    return np.frombuffer(values, dtype=np.int64).copy() if len(values) else np.zeros(0, dtype=np.int64)class MemberIndex:    """    群成员客户端索引    uid -> gids, gid -> uids 两个CSR格式的numpy数组,一次全量加载后按group_member.upt_time增量刷新    增量刷新的成员先追加到delta中,超过compact_size时合并进CSR数组    """    # 增量刷新的时间水位回退秒数,覆盖刷新时尚未提交的事务    WATERMARK_LAG = 10    def __init__(self, refresh_interval=10, chunk_size=10000, compact_size=100000):        empty = np.zeros(0, dtype=np.int64)        self.gids, self.gid_indptr, self.gid_uids = empty, np.zeros(1, dtype=np.int64), empty        self.uids, self.uid_indptr, self.uid_gids = empty, np.zeros(1, dtype=np.int64), empty        # 增量: gid -> [uid], uid -> [gid], 以及不在uids中的新用户        self.delta_gid_uids = {}        self.delta_uid_gids = {}        self.delta_uids = []        self.delta_size = 0        self.watermark = None        self.refresh_interval = refresh_interval        self.chunk_size = chunk_size        self.compact_size = compact_size        self.next_refresh = 0    @staticmethod    def _lookup(keys, indptr, values, key):        i = np.searchsorted(keys, key)        if i < len(keys) and keys[i] == key:            return values[indptr[i]:indptr[i + 1]]        return values[:0]    def _build(self, gids, uids):        self.gids, self.gid_indptr, self.gid_uids = build_csr(gids, uids)        self.uids, self.uid_indptr, self.uid_gids = build_csr(uids, gids)        self.delta_gid_uids, self.delta_uid_gids, self.delta_uids, self.delta_size = {}, {}, [], 0    def contains(self, gid, uid):        members = self._lookup(self.gids, self.gid_indptr, self.gid_uids, gid)        i = np.searchsorted(members, uid)        if i < len(members) and members[i] == uid:            return True        return uid in self.delta_gid_uids.get(gid, ())    def add(self, gid, uid):        if self.contains(gid, uid):            return        self.delta_gid_uids.setdefault(gid, []).append(uid)        if uid not in self.delta_uid_gids and not len(self._lookup(self.uids, self.uid_indptr, self.uid_gids, uid)):            self.delta_uids.append(uid)        self.delta_uid_gids.setdefault(uid, []).append(gid)        self.delta_size += 1        if self.delta_size >= self.compact_size:            self.compact()    def compact(self):        """把增量合并进CSR数组"""        if not self.delta_size:            return        gids, uids = array("q"), array("q")        for gid, members in self.delta_gid_uids.items():            gids.extend([gid] * len(members))            uids.extend(members)        self._build(np.concatenate([np.repeat(self.gids, np.diff(self.gid_indptr)), int64_array(gids)]),                    np.concatenate([self.gid_uids, int64_array(uids)]))    def _next_watermark(self, dao):        sql_query_watermark = "select now() - interval %s second watermark"        return dao.query2one(sql_query_watermark, (self.WATERMARK_LAG,))["watermark"]    def load(self, dao):        """按gid分段全量加载"""        sql_query_gid_range = "select min(gid) min_gid, max(gid) max_gid from `group_member`"        sql_query_group_member = "select gid,uid from `group_member` where gid >= %s and gid < %s"        self.next_refresh = time.time() + self.refresh_interval        watermark = self._next_watermark(dao)        gid_range = dao.query2one(sql_query_gid_range)        gids, uids = array("q"), array("q")        if gid_range["min_gid"] is not None:            for start in range(gid_range["min_gid"], gid_range["max_gid"] + 1, self.chunk_size):                for row in dao.query2list(sql_query_group_member, (start, start + self.chunk_size)):                    gids.append(row["gid"])                    uids.append(row["uid"])        self._build(int64_array(gids), int64_array(uids))        self.watermark = watermark        return self    def refresh(self, dao):        """增量加载upt_time在水位之后的群成员"""        sql_query_group_member = "select gid,uid from `group_member` where upt_time >= %s"        if self.watermark is None:            return self.load(dao)        self.next_refresh = time.time() + self.refresh_interval        watermark = self._next_watermark(dao)        for row in dao.query2list(sql_query_group_member, (self.watermark,)):            self.add(row["gid"], row["uid"])        self.watermark = watermark        return self    def maybe_refresh(self, dao):        if time.time() >= self.next_refresh:            self.refresh(dao)    def members(self, gid):        return (self._lookup(self.gids, self.gid_indptr, self.gid_uids, gid).tolist()                + self.delta_gid_uids.get(gid, []))    def groups(self, uid):        return (self._lookup(self.uids, self.uid_indptr, self.uid_gids, uid).tolist()                + self.delta_uid_gids.get(uid, []))    def first_gids(self, count):        """gid最小的count个群"""        return sorted(set(self.gids[:count].tolist()) | set(self.delta_gid_uids))[:count]    def random_uid(self):        """随机选择一个至少在一个群里的用户"""        total = len(self.uids) + len(self.delta_uids)        if not total:            return None        i = random.randrange(total)        return int(self.uids[i]) if i < len(self.uids) else self.delta_uids[i - len(self.uids)]    def random_gid(self, uid):        gids = self.groups(uid)        return random.choice(gids) if gids else None    def random_member(self, gid):        members = self.members(gid)        return random.choice(members) if members else None    def shuffled_members(self, gid):        members = self.members(gid)        random.shuffle(members)        return members# 每个进程共享一个群成员索引_member_index = Nonedef get_member_index(dao, refresh_interval=10):    """获取当前进程的群成员索引,首次调用时全量加载"""    global _member_index    if _member_index is None:        _member_index = MemberIndex(refresh_interval=refresh_interval)        _member_index.load(dao)    return _member_index
\ No newline at end of file
@@ -1 +1 @@
-#!/usr/bin/env python# coding=utf-8import randomimport tracebackimport pymysqlimport ConfigParserfrom pymysql import OperationalError, InternalErrorfrom my_util import init_loggerclass MyDAO:    """MySQL 简单封装"""    def __init__(self, connection_settings=None, logger=None):        self.connection = None        self.general_log = False        self.logger = logger if logger else init_logger()        if not connection_settings:            cf = ConfigParser.ConfigParser()            cf.read("hongbao.cnf")            server = random.choice(cf.sections())            connection_settings = {                'host': cf.get(server, "host"),                'port': cf.getint(server, "port"),                'user': cf.get(server, "user"),                'password': cf.get(server, "password"),                'charset': cf.get(server, "charset"),                'db': cf.get(server, "db")            }            self.logger.debug("MySQL server:[%s] %s:%d user:%s" % (server, cf.get(server, "host"), cf.getint(server, "port"), cf.get(server, "user")))        self.conn_setting = connection_settings    def __del__(self):        self.disconnect()    def set_general_log(self, val):        self.logger.debug("set general_log %s" % val)        self.general_log = val    def set_logger(self, val):        self.logger = val    def connect(self):        if not self.connection:            try:                self.connection = pymysql.connect(                    host=self.conn_setting["host"],                    user=self.conn_setting["user"],                    password=self.conn_setting["password"],                    db=self.conn_setting["db"],                    charset=self.conn_setting["charset"],                    cursorclass=pymysql.cursors.DictCursor                )            except OperationalError as oe:                self.logger.error("MySQL Operational Error:")                print(oe)            except InternalError as ie:                self.logger.error("MySQL Internal Error:")                print(ie)        if self.general_log:            with self.connection.cursor() as cursor:                    cursor.execute("set global general_log = 1")        return self.connection    def disconnect(self):        if self.connection:            if self.general_log:                self.logger.debug(u"关闭general_log日志")                with self.connection.cursor() as cursor:                    cursor.execute("set global general_log = 0")            self.connection.close()    def insert_auto(self, sql, data, conn=None):        if not conn:            conn = self.connect()        with conn as cursor:            cursor.execute(sql, data)            lastrowid = cursor.lastrowid        return lastrowid    def query2one(self, sql, para=None):        with self.connect() as cursor:            cursor.execute(sql, para)            return cursor.fetchone()    def query2list(self, sql, para=None):        with self.connect() as cursor:            cursor.execute(sql, para)            return cursor.fetchall()    def execute(self, sql_list=None):        if sql_list is None:            return False        conn = self.connect()        conn.autocommit(False)        conn.begin()        try:            with conn.cursor() as cursor:                for sql in sql_list:                    cursor.execute(sql)                conn.commit()                opt_success = True        except:            self.logger.error(traceback.format_exc())            conn.rollback()            opt_success = False        return opt_success    def trx_begin(self):        conn = self.connect()        conn.autocommit(False)        conn.begin()        return conn    def trx_end(self):        conn = self.connect()        conn.commit()        return conn
\ No newline at end of file
+#!/usr/bin/env python# coding=utf-8import randomimport sysimport timeimport tracebackimport pymysqltry:    import ConfigParserexcept ImportError:    import configparser as ConfigParserfrom collections import OrderedDictfrom pymysql import OperationalError, InternalError, InterfaceErrorfrom my_stats import StatsCursor, error_codefrom my_util import init_loggerclass ConnectionPool:    """    MySQL 连接池    每个[serverN]配置段一组连接,按routing选择server,失败时退避重连    """    ROUTINGS = ("random", "round_robin", "least_loaded")    def __init__(self, servers, routing="random", size=None, start=0, ping_interval=5,                 max_retries=10, backoff=0.1, max_backoff=5, logger=None):        if routing not in self.ROUTINGS:            raise ValueError("routing must be one of: %s" % ",".join(self.ROUTINGS))        self.servers = servers        self.routing = routing        # 每个server的空闲连接数: size参数优先,其次配置段的pool_size,默认1        self.sizes = dict((name, int(size if size is not None else setting.get("pool_size", 1)))                          for name, setting in servers.items())        self.ping_interval = ping_interval        self.max_retries = max_retries        self.backoff = backoff        self.max_backoff = max_backoff        self.logger = logger if logger else init_logger()        self.idle = dict((name, []) for name in servers)        self.busy = dict((name, 0) for name in servers)        # server重连失败后的冷却截止时间        self.down_until = dict((name, 0) for name in servers)        # 连接 -> [server, 最后使用时间]        self.conn_info = {}        self.next_server = start    @classmethod    def from_config(cls, config_file="hongbao.cnf", **kw):        """读取配置文件中所有server配置段"""        cf = ConfigParser.ConfigParser()        cf.read(config_file)        servers = OrderedDict()        for server in cf.sections():            servers[server] = {                'host': cf.get(server, "host"),                'port': cf.getint(server, "port"),                'user': cf.get(server, "user"),                'password': cf.get(server, "password"),                'charset': cf.get(server, "charset"),                'db': cf.get(server, "db")            }            if cf.has_option(server, "pool_size"):                servers[server]["pool_size"] = cf.getint(server, "pool_size")        if not servers:            raise ValueError("No MySQL server found in %s" % config_file)        return cls(servers, **kw)    def route(self):        """按路由策略选择server,优先选择未处于冷却期的server"""        now = time.time()        names = [name for name in self.servers if self.down_until[name] <= now]        if not names:            names = [min(self.servers, key=lambda name: self.down_until[name])]        all_names = list(self.servers)        if self.routing == "round_robin":            for i in range(len(all_names)):                name = all_names[(self.next_server + i) % len(all_names)]                if name in names:                    self.next_server = (self.next_server + i + 1) % len(all_names)                    return name        elif self.routing == "least_loaded":            # busy只统计本进程的连接,连接数相同时从start开始轮转,各worker的首个连接分散到不同server            rotated = [all_names[(self.next_server + i) % len(all_names)] for i in range(len(all_names))]            return min([name for name in rotated if name in names], key=lambda name: self.busy[name])        return random.choice(names)    def open(self, server):        setting = self.servers[server]        self.logger.debug("MySQL server:[%s] %s:%d user:%s" % (server, setting["host"], setting["port"], setting["user"]))        return pymysql.connect(            host=setting["host"],            port=setting["port"],            user=setting["user"],            password=setting["password"],            db=setting["db"],            charset=setting["charset"],            cursorclass=StatsCursor        )    def acquire(self):        """获取连接,连接失败时按指数退避重试,并切换server"""        delay = self.backoff        for attempt in range(self.max_retries + 1):            server = self.route()            conn = None            while self.idle[server]:                conn = self.idle[server].pop()                if self.is_alive(conn):                    break                self.discard(conn)                conn = None            try:                if conn is None:                    conn = self.open(server)            except (OperationalError, InternalError) as e:                self.down_until[server] = time.time() + delay                self.logger.error(u"MySQL server:[%s]连接失败(%s/%s),%0.1f秒后重试: %s"                                  % (server, attempt + 1, self.max_retries + 1, delay, e))                if attempt == self.max_retries:                    raise                time.sleep(delay)                delay = min(delay * 2, self.max_backoff)                continue            self.down_until[server] = 0            self.busy[server] += 1            self.conn_info[id(conn)] = [server, time.time()]            return conn    def is_alive(self, conn):        """连接存活检查,空闲超过ping_interval才发送ping"""        info = self.conn_info.get(id(conn))        if not conn.open or not info:            return False        now = time.time()        if now - info[1] > self.ping_interval:            try:                conn.ping(reconnect=False)            except Exception:                return False        info[1] = now        return True    def release(self, conn, broken=False):        """归还连接,已断开或超出池大小的连接直接关闭"""        info = self.conn_info.get(id(conn))        if not info:            return        server = info[0]        self.busy[server] -= 1        if broken or not conn.open or len(self.idle[server]) >= self.sizes[server]:            self.discard(conn)        else:            self.idle[server].append(conn)    def discard(self, conn):        self.conn_info.pop(id(conn), None)        try:            conn.close()        except Exception:            pass    def server_of(self, conn):        info = self.conn_info.get(id(conn))        return info[0] if info else None# 每个进程按配置文件和路由策略共享连接池_pools = {}def get_pool(config_file="hongbao.cnf", routing="random", **kw):    """获取当前进程的连接池,配置文件只读取一次"""    key = (config_file, routing)    if key not in _pools:        _pools[key] = ConnectionPool.from_config(config_file, routing=routing, **kw)    return _pools[key]class MyDAO:    """MySQL 简单封装"""    # 死锁(1213)和锁等待超时(1205)时回滚整个事务并重试    RETRY_ERRORS = (1213, 1205)    def __init__(self, connection_settings=None, logger=None, pool=None, stats=None):        self.connection = None        self.general_log = False        # 事务和SQL统计,为空时不记录        self.stats = stats        self.trx_name = None        self.trx_start = 0        # 当前事务是否已发送commit,用于区分提交结果未知的事务        self.commit_sent = False        # 锁冲突重试,超过次数放弃事务        self.max_trx_retries = 5        self.retry_backoff = 0.02        self.retry_max_backoff = 1        self.trx_retries = 0        self.trx_aborts = 0        self.logger = logger if logger else init_logger()        if pool is None:            if connection_settings:                pool = ConnectionPool(OrderedDict([("server", connection_settings)]), logger=self.logger)            else:                pool = get_pool(logger=self.logger)        self.pool = pool        self.conn_setting = connection_settings    def __del__(self):        self.disconnect()    def set_general_log(self, val):        self.logger.debug("set general_log %s" % val)        self.general_log = val    def set_logger(self, val):        self.logger = val    def connect(self):        # 连接断开或空闲后ping失败,从连接池重新获取        if self.connection and not self.pool.is_alive(self.connection):            self.logger.error(u"MySQL连接已断开,重新连接")            self.reset_connection()        if not self.connection:            self.connection = self.pool.acquire()            self.connection.stats = self.stats            if self.general_log:                with self.connection.cursor() as cursor:                    cursor.execute("set global general_log = 1")        return self.connection    def disconnect(self):        if self.connection:            if self.general_log and self.connection.open:                self.logger.debug(u"关闭general_log日志")                with self.connection.cursor() as cursor:                    cursor.execute("set global general_log = 0")            self.pool.release(self.connection)            self.connection = None    def insert_auto(self, sql, data, conn=None):        if not conn:            conn = self.connect()        with conn as cursor:            cursor.execute(sql, data)            lastrowid = cursor.lastrowid        return lastrowid    def query2one(self, sql, para=None):        return self._query(sql, para, lambda cursor: cursor.fetchone())    def query2list(self, sql, para=None):        return self._query(sql, para, lambda cursor: cursor.fetchall())    def _query(self, sql, para, fetch):        """只读查询,连接失效时重新连接并重试一次"""        try:            with self.connect() as cursor:                cursor.execute(sql, para)                return fetch(cursor)        except (OperationalError, InterfaceError):            if self.connection and self.connection.open:                raise            self.logger.error(traceback.format_exc())            self.reset_connection()        with self.connect() as cursor:            cursor.execute(sql, para)            return fetch(cursor)    def execute(self, sql_list=None, name="execute"):        """        在一个事务中执行sql_list,遇到死锁或锁等待超时时重试        sql_list的元素为sql或(sql, para)        """        if sql_list is None:            return False        for attempt in range(self.max_trx_retries + 1):            conn = self.trx_begin(name)            try:                with conn.cursor() as cursor:                    for sql in sql_list:                        if isinstance(sql, tuple):                            cursor.execute(*sql)                        else:                            cursor.execute(sql)                    self.trx_end(conn)                return True            except:                if self.trx_retry(conn, attempt):                    continue                self.logger.error(traceback.format_exc())                self.trx_rollback(conn)                return False    def trx_begin(self, name="trx"):        self.trx_name, self.trx_start = name, time.time()        self.commit_sent = False        conn = self.connect()        try:            conn.autocommit(False)            conn.begin()        except (OperationalError, InterfaceError) as e:            # 连接失效(如failover后),重新连接一次            self.logger.error(traceback.format_exc())            self.record(name, "retry")            self.record_error(name, e)            self.reset_connection()            conn = self.connect()            conn.autocommit(False)            conn.begin()        return conn    def trx_end(self, conn=None):        """提交事务,记录commit和事务延迟"""        conn = conn if conn else self.connection        start = time.time()        self.commit_sent = True        conn.commit()        end = time.time()        self.record("COMMIT", "execute", end - start)        self.record(self.trx_name, "commit", end - self.trx_start)        return conn    def trx_rollback(self, conn=None):        """回滚事务,记录回滚延迟和错误码,连接已断开时归还连接池,下次重新连接"""        e = sys.exc_info()[1]        if e is not None:            self.record_error(self.trx_name, e)        conn = conn if conn else self.connection        if not conn:            return        try:            conn.rollback()        except (OperationalError, InternalError, InterfaceError):            self.logger.error(traceback.format_exc())            if conn is self.connection:                self.reset_connection()        self.record(self.trx_name, "rollback", time.time() - self.trx_start)    def trx_retry(self, conn, attempt):        """        在事务的except中调用,当前异常为死锁或锁等待超时且未发送commit时,        回滚并按指数退避随机等待,返回True由调用方重新执行事务        """        if error_code(sys.exc_info()[1]) not in self.RETRY_ERRORS or self.commit_sent:            return False        if attempt >= self.max_trx_retries:            self.logger.error(u"[%s]锁冲突重试%d次后放弃" % (self.trx_name, attempt))            self.trx_aborts += 1            self.record(self.trx_name, "abort")            return False        self.logger.warning(u"[%s]锁冲突: %s, 第%d次重试" % (self.trx_name, sys.exc_info()[1], attempt + 1))        self.trx_rollback(conn)        self.trx_retries += 1        self.record(self.trx_name, "retry")        time.sleep(random.uniform(0, min(self.retry_max_backoff, self.retry_backoff * 2 ** attempt)))        return True    def call_available(self, method, *args, **kw):        """        调用method,数据库长时间不可用(连接池重试耗尽)时记录错误并返回False,        下次调用重新从连接池获取连接,worker不退出        """        try:            return method(*args, **kw)        except (OperationalError, InternalError, InterfaceError):            self.logger.error(traceback.format_exc())            self.reset_connection()            return False    def record(self, name, event, latency=None):        if self.stats is not None:            self.stats.record(name, event, latency)    def record_error(self, name, e):        if self.stats is not None:            self.stats.record_error(name, e)    def reset_connection(self):        """丢弃当前连接,下次connect时从连接池重新获取"""        if self.connection:            self.pool.release(self.connection, broken=True)            self.connection = None
\ No newline at end of file
@@ -0,0 +1 @@
+#!/usr/bin/env python# coding=utf-8import randomfrom collections import OrderedDictimport numpy as npUSER_LETTERS = np.array(list("abceefg"))GROUP_LETTERS = np.array(list("ABCDEFG"))# 名称数字部分取值范围 0 - 9000000000, 按步长在该范围内做置换, 同一随机流内不重复NAME_SPACE = 9000000001NAME_STRIDE = 536870909BIRTH_DAY_START = np.datetime64("1976-01-01")BIRTH_DAYS = int((np.datetime64("2017-12-31") - BIRTH_DAY_START).astype(int)) + 1KINDS = ("uname", "gname", "birth_day", "addr_province", "addr_city", "split")NAME_KINDS = ("uname", "gname")# 每个红包拆分缓存块最多包含的金额份数,人数越多的群每块预生成的拆分越少SPLIT_BLOCK_VALUES = 1024class RandomStream:    """    批量随机数据流    按block_size向量化预生成用户名,群名,生日,省份,城市和红包金额拆分,逐个取出    红包拆分按(金额, 人数)缓存,只保留最近使用的split_cache_size种    指定seed时,同一(seed, worker)的每种数据都是可重放的独立随机流    name_salt不为0时混入用户名和群名随机流,同一seed多次写入同一个库时名称不重复    """    def __init__(self, seed=None, worker=0, block_size=10000, split_block_size=256, split_cache_size=4,                 name_salt=0):        self.block_size = block_size        self.split_block_size = split_block_size        self.split_cache_size = split_cache_size        self.rngs = dict((kind, np.random.RandomState(None if seed is None else [seed, worker, i] + (            [name_salt] if name_salt and kind in NAME_KINDS else []))) for i, kind in enumerate(KINDS))        self.blocks = {}        self.splits = OrderedDict()        self.name_counters = {"uname": 0, "gname": 0}        self.name_offsets = dict((kind, int(self.rngs[kind].randint(0, NAME_SPACE))) for kind in self.name_counters)    def take(self, kind, count):        """取出count个kind类型的随机值"""        values = []        while len(values) < count:            block = self.blocks.get(kind)            if block is None or block[1] >= len(block[0]):                block = self.blocks[kind] = [getattr(self, "_" + kind)(self.block_size), 0]            end = min(len(block[0]), block[1] + count - len(values))            values.extend(block[0][block[1]:end])            block[1] = end        return values    def next(self, kind):        block = self.blocks.get(kind)        if block is None or block[1] >= len(block[0]):            block = self.blocks[kind] = [getattr(self, "_" + kind)(self.block_size), 0]        block[1] += 1        return block[0][block[1] - 1]    def uname(self):        return self.next("uname")    def gname(self):        return self.next("gname")    def birth_day(self):        return self.next("birth_day")    def addr_province(self):        return self.next("addr_province")    def addr_city(self):        return self.next("addr_city")    def split(self, amount, count):        """        红包金额随机拆分为count份,每份至少1分,总和等于amount        amount小于count时只拆分为amount份        """        count = min(count, amount)        if count <= 0:            return []        key = (amount, count)        block = self.splits.pop(key, None)        if block is None or block[1] >= len(block[0]):            size = max(1, min(self.split_block_size, SPLIT_BLOCK_VALUES // count))            block = [self._split(amount, count, size), 0]        # 最近使用的放在最后,超出缓存数量时淘汰最早使用的        self.splits[key] = block        while len(self.splits) > self.split_cache_size:            self.splits.popitem(last=False)        block[1] += 1        return block[0][block[1] - 1].tolist()    def _names(self, kind, letters, count):        rng = self.rngs[kind]        prefix = letters[rng.randint(0, len(letters), size=(count, 3))]        counters = np.arange(self.name_counters[kind], self.name_counters[kind] + count, dtype=np.int64)        self.name_counters[kind] += count        numbers = (self.name_offsets[kind] + counters % NAME_SPACE * NAME_STRIDE) % NAME_SPACE        names = np.char.add(np.char.add(np.char.add(prefix[:, 0], prefix[:, 1]), prefix[:, 2]), numbers.astype(str))        return names.tolist()    def _uname(self, count):        return self._names("uname", USER_LETTERS, count)    def _gname(self, count):        return self._names("gname", GROUP_LETTERS, count)    def _birth_day(self, count):        days = self.rngs["birth_day"].randint(0, BIRTH_DAYS, size=count)        return (BIRTH_DAY_START + days).astype(str).tolist()    def _addr_province(self, count):        return self.rngs["addr_province"].randint(1, 35, size=count).tolist()    def _addr_city(self, count):        return self.rngs["addr_city"].randint(1, 341, size=count).tolist()    def _split(self, amount, count, size):        """按均匀Dirichlet分布拆分amount - count,再每份加1,四舍五入误差补给小数部分最大的几份"""        extra = amount - count        raw = self.rngs["split"].dirichlet(np.ones(count), size) * extra        shares = np.floor(raw).astype(np.int64)        remainder = extra - shares.sum(axis=1)        ranks = np.argsort(np.argsort(shares - raw, axis=1), axis=1)        shares += ranks < remainder[:, None]        return shares + 1def seed_worker(seed, worker, name_salt=0):    """    固定worker内random和numpy全局随机数,并返回该worker的随机数据流    seed为空时不固定    """    if seed is not None:        random.seed(seed * 1000003 + worker)        np.random.seed([seed, worker])    return RandomStream(seed, worker, name_salt=name_salt)
\ No newline at end of file
@@ -0,0 +1 @@
+#!/usr/bin/env python# coding=utf-8import csvimport jsonimport mathimport reimport sysimport threadingimport timeimport pymysqltry:    from Queue import Emptyexcept ImportError:    from queue import Empty# 延迟直方图桶宽,相邻桶相差10%BUCKET_BASE = 1.1RE_VALUES = re.compile(r"\bvalues\b", re.I)RE_NUMBER = re.compile(r"\b\d+\b")RE_PLACEHOLDER_LIST = re.compile(r"(?:\?|%s)(?:\s*,\s*(?:\?|%s))+")def latency_bucket(seconds):    """延迟(秒)映射到对数直方图桶,单位为微秒"""    return int(math.log(max(seconds * 1000000, 1), BUCKET_BASE))def bucket_latency(bucket):    """桶的代表延迟,单位为毫秒"""    return BUCKET_BASE ** (bucket + 0.5) / 1000def statement_key(query):    """    SQL语句归类,多行insert只保留values之前的部分    数字常量替换为?, in列表等连续占位符合并为一个,拼接进SQL的参数不会产生新的统计项    """    query = " ".join(query.split())    m = RE_VALUES.search(query)    if m:        query = query[:m.end()]    query = RE_PLACEHOLDER_LIST.sub("?,...", RE_NUMBER.sub("?", query))    return query[:80]def error_code(e):    """MySQL错误码,非MySQL异常返回异常类名"""    if isinstance(e, pymysql.MySQLError) and e.args and isinstance(e.args[0], int):        return e.args[0]    return e.__class__.__name__class Stats:    """    事务和SQL语句统计    按(name, event)计数并记录延迟直方图,定期把增量发送到reporter进程汇总    name为事务类型或SQL语句, event为commit,rollback,retry,abort,execute,error:<code>,stmt_error:<code>    error:<code>按事务记录, stmt_error:<code>按SQL语句记录,同一个异常不会在errors()中重复计数    """    def __init__(self, queue=None, flush_interval=1):        self.queue = queue        self.flush_interval = flush_interval        self.counters = {}        self.histograms = {}        self.last_flush = time.time()    def record(self, name, event, latency=None):        key = (name, event)        self.counters[key] = self.counters.get(key, 0) + 1        if latency is not None:            histogram = self.histograms.setdefault(key, {})            bucket = latency_bucket(latency)            histogram[bucket] = histogram.get(bucket, 0) + 1        if self.queue is not None and time.time() - self.last_flush >= self.flush_interval:            self.flush()    def record_error(self, name, e):        self.record(name, "error:%s" % error_code(e))    def record_statement_error(self, query, e):        self.record(statement_key(query), "stmt_error:%s" % error_code(e))    def merge(self, snapshot):        counters, histograms = snapshot        for key, count in counters.items():            self.counters[key] = self.counters.get(key, 0) + count        for key, buckets in histograms.items():            histogram = self.histograms.setdefault(key, {})            for bucket, count in buckets.items():                histogram[bucket] = histogram.get(bucket, 0) + count    def snapshot(self, reset=False):        snapshot = (self.counters, self.histograms)        if reset:            self.counters, self.histograms = {}, {}        return snapshot    def flush(self):        """把增量统计发送到reporter"""        self.last_flush = time.time()        if self.queue is not None and self.counters:            self.queue.put(self.snapshot(reset=True))    def count(self, event, name=None):        return sum(count for (n, e), count in self.counters.items()                   if e == event and (name is None or n == name))    def percentiles(self, event, name=None, percents=(50, 95, 99)):        """合并后的延迟百分位,单位为毫秒"""        merged = {}        for (n, e), buckets in self.histograms.items():            if e == event and (name is None or n == name):                for bucket, count in buckets.items():                    merged[bucket] = merged.get(bucket, 0) + count        total = sum(merged.values())        result = []        for percent in percents:            if not total:                result.append(0)                continue            target, seen = total * percent / 100.0, 0            for bucket in sorted(merged):                seen += merged[bucket]                if seen >= target:                    result.append(bucket_latency(bucket))                    break        return result    def errors(self):        """事务级各错误码出现次数"""        errors = {}        for (_, event), count in self.counters.items():            if event.startswith("error:"):                errors[event[6:]] = errors.get(event[6:], 0) + count        return errorsclass StatsCursor(pymysql.cursors.DictCursor):    """记录每条SQL延迟和错误码的DictCursor,统计对象挂在connection.stats上"""    def execute(self, query, args=None):        stats = getattr(self.connection, "stats", None)        if stats is None:            return pymysql.cursors.DictCursor.execute(self, query, args)        start = time.time()        try:            result = pymysql.cursors.DictCursor.execute(self, query, args)        except Exception as e:            stats.record_statement_error(query, e)            raise        stats.record(statement_key(query), "execute", time.time() - start)        return resultclass StatsReporter(threading.Thread):    """汇总所有worker的统计,每interval秒输出TPS和延迟百分位,结束时写汇总文件"""    def __init__(self, queue, interval=5, output=None, stream=sys.stdout):        threading.Thread.__init__(self)        self.daemon = True        self.queue = queue        self.interval = interval        self.output = output        self.stream = stream        self.total = Stats()        self.timeline = []        self.start_time = time.time()    def run(self):        current = Stats()        next_report = self.start_time + self.interval        running = True        while running:            try:                snapshot = self.queue.get(timeout=max(next_report - time.time(), 0.01))            except Empty:                snapshot = False            if snapshot is None:                running = False            elif snapshot:                current.merge(snapshot)                self.total.merge(snapshot)            if time.time() >= next_report or not running:                self.report(current, time.time() - next_report + self.interval)                current = Stats()                next_report += self.interval        self.summary()    def stop(self):        self.queue.put(None)        self.join()    def report(self, stats, seconds):        commits, rollbacks = stats.count("commit"), stats.count("rollback")        p50, p95, p99 = stats.percentiles("commit")        errors = stats.errors()        elapsed = time.time() - self.start_time        self.timeline.append({            "elapsed": round(elapsed, 3),            "tps": round(commits / seconds, 2) if seconds > 0 else 0,            "commit": commits,            "rollback": rollbacks,            "retry": stats.count("retry"),            "abort": stats.count("abort"),            "p50_ms": round(p50, 3),            "p95_ms": round(p95, 3),            "p99_ms": round(p99, 3),            "errors": errors,        })        self.stream.write("[%7.1fs] tps: %8.1f commit: %6d rollback: %4d retry: %4d abort: %4d "                          "p50/p95/p99: %.2f/%.2f/%.2f ms%s\n" % (            elapsed, self.timeline[-1]["tps"], commits, rollbacks, stats.count("retry"), stats.count("abort"),            p50, p95, p99,            (" errors: " + ",".join("%s:%s" % item for item in sorted(errors.items()))) if errors else ""))        self.stream.flush()    def summary_rows(self):        """按事务类型/SQL语句和事件汇总"""        rows = []        for (name, event), count in sorted(self.total.counters.items()):            p50, p95, p99 = self.total.percentiles(event, name)            rows.append({"name": name, "event": event, "count": count,                         "p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "p99_ms": round(p99, 3)})        return rows    def summary(self):        elapsed = time.time() - self.start_time        commits = self.total.count("commit")        p50, p95, p99 = self.total.percentiles("commit")        self.stream.write("total: %0.1fs commit: %d rollback: %d tps: %.1f p50/p95/p99: %.2f/%.2f/%.2f ms\n" % (            elapsed, commits, self.total.count("rollback"), commits / elapsed if elapsed else 0, p50, p95, p99))        self.stream.flush()        if not self.output:            return        if self.output.endswith(".csv"):            with open(self.output, "w") as f:                writer = csv.DictWriter(f, fieldnames=["name", "event", "count", "p50_ms", "p95_ms", "p99_ms"])                writer.writeheader()                for row in self.summary_rows():                    writer.writerow(row)        else:            with open(self.output, "w") as f:                json.dump({"elapsed": round(elapsed, 3), "timeline": self.timeline, "summary": self.summary_rows()},                          f, indent=2, sort_keys=True)
\ No newline at end of file
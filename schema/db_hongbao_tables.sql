@@ -118,6 +118,7 @@ create table `hongbao`(
   add_time datetime not null default CURRENT_TIMESTAMP COMMENT '新增时间',
   upt_time datetime not null default CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
   primary key(reid),
+  key(uid),
   key(upt_time),
   key(add_time)
 )engine=innodb, COMMENT '红包表';
@@ -131,6 +132,7 @@ create table `hongbao_detail`(
   upt_time datetime not null default CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
   primary key(id),
   key(reid),
+  key(uid),
   key(add_time),
   key(upt_time)
 )engine=innodb, COMMENT '红包明细表';
@@ -0,0 +1 @@
+# coding=utf-8import osimport sys# 源码使用包目录内的相对导入sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pymysql_transaction_commitor"))
\ No newline at end of file
@@ -0,0 +1 @@
+# coding=utf-8import shutilimport tempfileimport unittestfrom hongbao_journal import Journal, JournalVerifierclass StubDAO:    """按表名和id列过滤内存中的行"""    TABLES = (("`hongbao_detail`", "reid"), ("`hongbao`", "reid"), ("`group_member`", "gid"), ("`group`", "gid"))    def __init__(self, **tables):        self.tables = tables        self.queries = 0    def query2list(self, sql, params):        self.queries += 1        for table, column in self.TABLES:            if table in sql:                return [row for row in self.tables.get(table.strip("`"), []) if row[column] in params]        raise ValueError(sql)class JournalVerifierTest(unittest.TestCase):    def setUp(self):        self.journal_dir = tempfile.mkdtemp()        journal = Journal.for_worker(self.journal_dir, "test")        # 已确认且一致        journal.hongbao(1, 10, 100, 5, [(11, 2), (12, 3)])        # 已确认但红包明细不一致        journal.hongbao(2, 10, 100, 5, [(11, 5)])        # 已确认但不存在        journal.hongbao(3, 10, 100, 5, [(11, 5)])        # 未确认但已提交        journal.hongbao(4, 10, 100, 5, [(12, 5)], acked=False)        # 未确认且未提交        journal.hongbao(5, 10, 100, 5, [(12, 5)], acked=False)        journal.group(100, 10, [10, 11, 12])        journal.group(101, 10, [10, 11])        journal.group(102, 10, [10], acked=False)        journal.close()        self.dao = StubDAO(            hongbao=[dict(reid=reid, uid=10, gid=100, amount=5) for reid in (1, 2, 4)],            hongbao_detail=[dict(reid=1, uid=12, amount=3), dict(reid=1, uid=11, amount=2),                            dict(reid=2, uid=11, amount=4), dict(reid=2, uid=12, amount=1),                            dict(reid=4, uid=12, amount=5)],            group=[dict(gid=100, create_uid=10), dict(gid=101, create_uid=10)],            group_member=[dict(gid=100, uid=uid) for uid in (12, 10, 11)] + [dict(gid=101, uid=10)])    def tearDown(self):        shutil.rmtree(self.journal_dir)    def test_classification(self):        result = JournalVerifier(self.dao).verify(self.journal_dir)        self.assertEqual(result["checked"], 8)        self.assertEqual(sorted(result["lost"]), ["G:101", "H:2", "H:3"])        self.assertEqual(result["unacked_present"], ["H:4"])        self.assertEqual(result["unacked_absent"], 2)    def test_batches(self):        result = JournalVerifier(self.dao, batch_size=2).verify(self.journal_dir)        self.assertEqual(sorted(result["lost"]), ["G:101", "H:2", "H:3"])        self.assertEqual(result["unacked_present"], ["H:4"])        self.assertEqual(result["unacked_absent"], 2)        # 5个红包分3批, 3个群分2批, 每批查询主表和明细表        self.assertEqual(self.dao.queries, 10)if __name__ == '__main__':    unittest.main()
\ No newline at end of file
@@ -0,0 +1 @@
+# coding=utf-8import unittestfrom hongbao_manager import HongbaoManagerclass UpdateUserSqlTest(unittest.TestCase):    def test_uids_sorted_with_case_params_first(self):        sql, para = HongbaoManager._update_user_sql("balance", {5: -10, 2: 3, 9: 7})        self.assertEqual(sql, "update `user` set balance = balance + case uid "                              "when %s then %s when %s then %s when %s then %s end where uid in (%s,%s,%s)")        self.assertEqual(para, [2, 3, 5, -10, 9, 7, 2, 5, 9])    def test_single_uid(self):        sql, para = HongbaoManager._update_user_sql("friends", {3: 1})        self.assertEqual(sql, "update `user` set friends = friends + case uid when %s then %s end where uid in (%s)")        self.assertEqual(para, [3, 1, 3])if __name__ == '__main__':    unittest.main()
\ No newline at end of file
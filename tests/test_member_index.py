@@ -0,0 +1 @@
+# coding=utf-8import unittestfrom member_index import MemberIndexclass StubDAO:    """按gid范围返回group_member,按upt_time水位返回新增成员"""    def __init__(self, rows):        self.rows = list(rows)        self.changed = []    def query2one(self, sql, para=None):        if "watermark" in sql:            return {"watermark": "2018-01-01 00:00:00"}        gids = [gid for gid, _ in self.rows]        return {"min_gid": min(gids) if gids else None, "max_gid": max(gids) if gids else None}    def query2list(self, sql, para=None):        if "upt_time" in sql:            return [{"gid": gid, "uid": uid} for gid, uid in self.changed]        return [{"gid": gid, "uid": uid} for gid, uid in self.rows if para[0] <= gid < para[1]]class MemberIndexTest(unittest.TestCase):    rows = [(3, 30), (1, 10), (1, 11), (2, 11), (5, 12), (3, 10)]    def assert_index(self, index, rows):        gid_members, uid_gids = {}, {}        for gid, uid in rows:            gid_members.setdefault(gid, set()).add(uid)            uid_gids.setdefault(uid, set()).add(gid)        for gid, members in gid_members.items():            self.assertEqual(sorted(index.members(gid)), sorted(members))        for uid, gids in uid_gids.items():            self.assertEqual(sorted(index.groups(uid)), sorted(gids))        self.assertEqual(sorted(index.uids.tolist() + index.delta_uids), sorted(uid_gids))    def test_load_in_chunks(self):        index = MemberIndex(chunk_size=2).load(StubDAO(self.rows))        self.assert_index(index, self.rows)        self.assertEqual(index.members(4), [])        self.assertIsNone(index.random_gid(99))        self.assertIn(index.random_uid(), (10, 11, 12, 30))        self.assertIn(index.random_member(1), (10, 11))    def test_empty(self):        index = MemberIndex().load(StubDAO([]))        self.assertIsNone(index.random_uid())        self.assertEqual(index.first_gids(3), [])    def test_refresh_appends_deltas_without_duplicates(self):        dao = StubDAO(self.rows)        index = MemberIndex(compact_size=100).load(dao)        # 水位回退会重复读到已加载的成员        dao.changed = [(1, 10), (2, 12), (6, 40), (6, 40)]        index.refresh(dao)        self.assertEqual(index.delta_size, 2)        self.assertEqual(index.delta_uids, [40])        self.assert_index(index, self.rows + dao.changed)        self.assertTrue(index.contains(2, 12))        self.assertFalse(index.contains(2, 10))    def test_compact_merges_deltas(self):        dao = StubDAO(self.rows)        index = MemberIndex(compact_size=3).load(dao)        dao.changed = [(2, 12), (6, 40), (0, 10), (7, 41)]        index.refresh(dao)        # 第3条时合并进CSR数组,第4条留在delta中        self.assertEqual(index.delta_size, 1)        self.assertEqual(sorted(index.gids.tolist()), [0, 1, 2, 3, 5, 6])        self.assert_index(index, self.rows + dao.changed)        index.compact()        self.assertEqual(index.delta_size, 0)        self.assert_index(index, self.rows + dao.changed)    def test_first_gids(self):        dao = StubDAO(self.rows)        index = MemberIndex().load(dao)        self.assertEqual(index.first_gids(2), [1, 2])        dao.changed = [(0, 10)]        index.refresh(dao)        self.assertEqual(index.first_gids(2), [0, 1])        self.assertEqual(index.first_gids(10), [0, 1, 2, 3, 5])if __name__ == '__main__':    unittest.main()
\ No newline at end of file
@@ -0,0 +1 @@
+# coding=utf-8import loggingimport unittestfrom pymysql import IntegrityError, OperationalErrorfrom collections import OrderedDictfrom my_dao import ConnectionPool, MyDAOfrom my_stats import Statsclass StubCursor:    def __init__(self, conn):        self.conn = conn    def __enter__(self):        return self    def __exit__(self, *args):        pass    def execute(self, sql, para=None):        self.conn.executed.append((sql, para))        if self.conn.errors:            error = self.conn.errors.pop(0)            if error:                raise errorclass StubConnection:    """按顺序对每条execute抛出errors中的异常,None表示成功"""    def __init__(self, errors=(), commit_error=None):        self.open = True        self.errors = list(errors)        self.commit_error = commit_error        self.executed = []        self.commits = 0        self.rollbacks = 0    def cursor(self):        return StubCursor(self)    def autocommit(self, value):        pass    def begin(self):        pass    def commit(self):        if self.commit_error:            raise self.commit_error        self.commits += 1    def rollback(self):        self.rollbacks += 1class StubPool:    def __init__(self, conn):        self.conn = conn    def acquire(self):        return self.conn    def is_alive(self, conn):        return True    def release(self, conn, broken=False):        passdef deadlock():    return OperationalError(1213, "Deadlock found when trying to get lock")def lock_wait_timeout():    return OperationalError(1205, "Lock wait timeout exceeded")class TrxRetryTest(unittest.TestCase):    def dao(self, conn):        dao = MyDAO(logger=logging.getLogger("test_my_dao"), pool=StubPool(conn), stats=Stats())        dao.retry_backoff = 0        return dao    def test_retry_after_deadlock(self):        conn = StubConnection([None, deadlock()])        dao = self.dao(conn)        self.assertTrue(dao.execute([("update a set x = %s", (1,)), "update b set y = 1"], "trx"))        self.assertEqual(len(conn.executed), 4)        self.assertEqual((conn.commits, conn.rollbacks), (1, 1))        self.assertEqual((dao.trx_retries, dao.trx_aborts), (1, 0))        self.assertEqual(dao.stats.count("retry", "trx"), 1)        self.assertEqual(dao.stats.errors(), {"1213": 1})    def test_abort_after_max_retries(self):        conn = StubConnection([lock_wait_timeout()] * 10)        dao = self.dao(conn)        dao.max_trx_retries = 3        self.assertFalse(dao.execute(["update a set x = 1"], "trx"))        self.assertEqual((conn.commits, conn.rollbacks), (0, 4))        self.assertEqual((dao.trx_retries, dao.trx_aborts), (3, 1))        self.assertEqual(dao.stats.count("abort", "trx"), 1)    def test_no_retry_after_commit_sent(self):        conn = StubConnection(commit_error=deadlock())        dao = self.dao(conn)        self.assertFalse(dao.execute(["update a set x = 1"], "trx"))        self.assertEqual(len(conn.executed), 1)        self.assertEqual((dao.trx_retries, dao.trx_aborts), (0, 0))    def test_no_retry_on_other_errors(self):        conn = StubConnection([IntegrityError(1062, "Duplicate entry")])        dao = self.dao(conn)        self.assertFalse(dao.execute(["insert into a set x = 1"], "trx"))        self.assertEqual((conn.rollbacks, dao.trx_retries, dao.trx_aborts), (1, 0, 0))class RouteTest(unittest.TestCase):    logger = logging.getLogger("test_my_dao")    def servers(self):        return OrderedDict((name, {}) for name in ("server1", "server2", "server3"))    def test_least_loaded_spreads_new_workers(self):        routes = [ConnectionPool(self.servers(), routing="least_loaded", start=i, logger=self.logger).route()                  for i in range(6)]        self.assertEqual(routes, ["server1", "server2", "server3"] * 2)    def test_least_loaded_skips_busy_and_down_servers(self):        pool = ConnectionPool(self.servers(), routing="least_loaded", start=1, logger=self.logger)        pool.busy["server2"] = 1        self.assertEqual(pool.route(), "server3")        pool.down_until["server3"] = float("inf")        self.assertEqual(pool.route(), "server1")if __name__ == '__main__':    unittest.main()
\ No newline at end of file
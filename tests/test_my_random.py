@@ -0,0 +1 @@
+# coding=utf-8import unittestfrom my_random import RandomStreamclass RandomStreamSplitTest(unittest.TestCase):    def assert_split(self, shares, amount, count):        self.assertEqual(len(shares), min(count, amount))        self.assertEqual(sum(shares), amount if count > 0 else 0)        self.assertTrue(all(share >= 1 for share in shares))    def test_split_sum_min_and_length(self):        rs = RandomStream(seed=1)        for amount in (1, 2, 7, 100, 10000, 12345):            for count in (0, 1, 2, 5, 37, 100, 500):                for _ in range(3):                    self.assert_split(rs.split(amount, count), amount, count)    def test_split_across_blocks(self):        rs = RandomStream(seed=2, split_block_size=4)        for _ in range(50):            self.assert_split(rs.split(10000, 20), 10000, 20)    def test_split_cache_is_bounded(self):        rs = RandomStream(seed=3, split_cache_size=4)        for count in range(5, 101):            self.assert_split(rs.split(10000, count), 10000, count)            self.assertLessEqual(len(rs.splits), 4)        # 人数越多,每块预生成的拆分越少        self.assertLessEqual(max(block[0].size for block in rs.splits.values()), 1024)    def test_split_is_reproducible(self):        a, b = RandomStream(seed=4, worker=1), RandomStream(seed=4, worker=1)        for count in (10, 20, 10, 30, 40, 50, 10):            self.assertEqual(a.split(10000, count), b.split(10000, count))        self.assertNotEqual(RandomStream(seed=4, worker=2).split(10000, 10), RandomStream(seed=4).split(10000, 10))if __name__ == '__main__':    unittest.main()
\ No newline at end of file
@@ -0,0 +1 @@
+# coding=utf-8import unittestimport pymysqlfrom my_stats import Stats, bucket_latency, latency_bucket, statement_keyclass StatsTest(unittest.TestCase):    def test_merge_adds_counters_and_histograms(self):        a, b = Stats(), Stats()        a.record("create_hongbao", "commit", 0.01)        b.record("create_hongbao", "commit", 0.01)        b.record("create_hongbao", "commit", 0.1)        b.record("create_group", "rollback")        total = Stats()        total.merge(a.snapshot())        total.merge(b.snapshot(reset=True))        self.assertEqual(total.count("commit"), 3)        self.assertEqual(total.count("commit", "create_group"), 0)        self.assertEqual(total.count("rollback", "create_group"), 1)        self.assertEqual(total.histograms[("create_hongbao", "commit")],                         {latency_bucket(0.01): 2, latency_bucket(0.1): 1})        self.assertEqual(b.counters, {})    def test_percentiles(self):        stats = Stats()        self.assertEqual(stats.percentiles("commit"), [0, 0, 0])        for _ in range(90):            stats.record("a", "commit", 0.001)        for _ in range(10):            stats.record("b", "commit", 0.1)        p50, p95, p99 = stats.percentiles("commit")        self.assertEqual(p50, bucket_latency(latency_bucket(0.001)))        self.assertEqual(p95, bucket_latency(latency_bucket(0.1)))        self.assertEqual(p99, p95)        # 桶宽10%,代表延迟与实际延迟相差不超过10%        self.assertAlmostEqual(p50, 1, delta=0.1)        self.assertAlmostEqual(p95, 100, delta=10)        self.assertEqual(stats.percentiles("commit", "a"), [p50, p50, p50])    def test_errors_count_transaction_errors_only(self):        stats = Stats()        e = pymysql.err.OperationalError(1213, "Deadlock found")        stats.record_statement_error("update `user` set balance = balance - 1 where uid = 1", e)        stats.record_error("create_hongbao", e)        stats.record_error("create_hongbao", ValueError("bad"))        self.assertEqual(stats.errors(), {"1213": 1, "ValueError": 1})        self.assertEqual(stats.count("stmt_error:1213"), 1)    def test_statement_key_is_bounded(self):        keys = set([statement_key("select uid from `user` where uid in (%s) and gid = %d" % (            ",".join([str(uid) for uid in range(count)]), count)) for count in range(2, 50)])        self.assertEqual(keys, set(["select uid from `user` where uid in (?,...) and gid = ?"]))        self.assertEqual(statement_key("insert into t (a, b) values (1, 2), (3, 4)"), "insert into t (a, b) values")if __name__ == '__main__':    unittest.main()
\ No newline at end of file